@@ -64,15 +64,27 @@ struct PonyAnalyzer
 
 	void find_messages()
 	{
-		std::vector<int> init_sequence = {0, 0, 0, 0, 2, 4, 2, 0, 0, 0, 0, 0, 1, 0, 0};
+		// pulses of the preamble 0xb5, K.28.7, MAGIC (0x9e for master to slave,
+		// 0x74 for slave to master), without the first and the last pulse
+		std::vector<std::vector<int>> init_sequences = {
+			{0, 0, 0, 0, 0, 0, 0, 0, 2, 4, 3, 3, 2, 0},
+			{0, 0, 0, 0, 0, 0, 0, 0, 2, 4, 4, 0, 0, 3}
+		};
 
 		for (size_t i = 0, pos = 0; i+20 < pulses.size(); pos += pulses[i], i++)
 		for (size_t k = 0; k < timing_configs.size(); k++)
 		{
 			float base_width = ((pulses[i] + pulses[i+1] + pulses[i+2] + pulses[i+3]) / 4.0) / timing_configs[k][0];
-			for (size_t n = 0; n < init_sequence.size(); n++)
-				if (!about_equal(timing_configs[k][init_sequence[n]]*base_width, pulses[i+n]))
-					goto next_sample;
+			for (auto &init_sequence : init_sequences) {
+				for (size_t n = 0; n < init_sequence.size(); n++)
+					if (!about_equal(timing_configs[k][init_sequence[n]]*base_width, pulses[i+n]))
+						goto next_sequence;
+				goto found_message;
+			next_sequence:;
+			}
+			goto next_sample;
+
+		found_message:;
 
 			std::cout << "Message #" << messages.size() << ": Start at sample " << pos << " (pulse " << i <<
 					") with timing profile " << k << " and base width " << base_width << "." << std::endl;
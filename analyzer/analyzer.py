@@ -0,0 +1,1334 @@
+#!/usr/bin/python
+#
+# analyzer.py is a NumPy port of analyzer.cc. It reads a waveform captured on
+# a PonyLink line, extracts the pulses, finds the preamble of each message and
+# decodes the 8b10b symbols. The output is the same as the output of
+# analyzer.cc.
+#
+# Pulse extraction, preamble matching and symbol decoding work on whole
+# arrays instead of one sample or pulse at a time, so captures with hundreds
+# of millions of samples are analyzed in seconds.
+#
+# The input is either a text file with one sample per line (like analyzer.cc),
+# a raw binary capture (int8, int16 or float32 samples) or a .npy file. Binary
+# files are memory-mapped and processed in chunks, so captures larger than the
+# available RAM can be decoded.
+#
+# In streaming mode (-s) the samples are read incrementally from a pipe or a
+# file (-F follows a growing file) and the messages are printed as soon as they
+# are decoded. The trigger level follows the envelope of the signal and uses
+# hysteresis, so baseline wander on AC-coupled links does not break the pulse
+# extraction.
+#
+# With -a the timing profiles are not given but inferred from the capture:
+# preambles are located by their pattern of pulse classes alone, grouped by
+# the width of their single bit pulses (one group per direction) and the pulse
+# widths of each group are clustered into the five pulse classes.
+#
+# With -P the symbols are not dumped but decoded as packets (see protocol.py),
+# which prints the CRC status of each packet and the recovered AXIS words.
+#
+# With -j the preamble search and the decoding run in a pool of worker
+# processes. The workers read the pulses from a shared memory-mapped file, the
+# capture is split into chunks of pulses for the preamble search and at message
+# starts into groups of messages for decoding, and the output is merged in
+# order.
+#
+# With -J the widths of the decoded pulses are collected per direction (told
+# apart by the magic byte in the preamble), timing profile and pulse class
+# and written as JSON: histograms, min/max/mean/sigma, the
+# cycle width, the pulse (edge-to-edge) jitter and the margins to the limits
+# of the analyzer and (with -R) to the sample windows of the receiver as
+# computed by timings.py.
+#
+# Example usage:
+#
+#   python analyzer.py waveform.txt
+#   python analyzer.py -t 1,2,3,4,5 -t 2,4,6,8,10 waveform.txt
+#   python analyzer.py -f int8 capture.bin
+#   python analyzer.py capture.npy
+#   python analyzer.py -a -f int8 capture.bin
+#   python analyzer.py -P -D 8,16 -U 0,2 capture.npy
+#   python analyzer.py -j 0 -f int8 capture.bin
+#   python analyzer.py -a -S 0.5 -R 19,0.25 -R 6,1.5 -J jitter.json capture.npy
+#   capture-tool | python analyzer.py -s -f int8 -
+#   python analyzer.py -F -f int16 growing-capture.bin
+#
+#   from analyzer import PonyAnalyzer
+#   pa = PonyAnalyzer()
+#   pa.read_samples("waveform.txt")
+#   pa.extract_pulses()
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import json
+import getopt
+import tempfile
+import multiprocessing
+import numpy as np
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plinksrc"))
+
+from protocol import ProtocolDecoder
+from bitdist import encode, sym_reset, magic_m2s, magic_s2m
+from timings import TimingSolver, histogram_moments, fit_cycle, quantization_variance
+
+Message = namedtuple("Message", "start_index timing_cfg base_width")
+
+# Result of infer_timing_profiles(): timings are the smallest integer pulse
+# widths (in transmitter cycles) with the measured ratios, cycle is the width
+# of one transmitter cycle in samples, widths the measured mean width of each
+# pulse class in samples and counts the number of pulses in each class.
+TimingProfile = namedtuple("TimingProfile", "timings cycle widths counts npreambles")
+
+def preamble_sequence(magic):
+    """
+    Returns the pulse classes (indices into the timing profile) of the
+    preamble 0xb5, K.28.7, magic that ponylink_txrx sends at the start of
+    each packet. The first pulse (which can merge with the previous symbol)
+    and the last pulse (which merges with the next symbol) are left out.
+    """
+    codes, _ = encode([0xb5, sym_reset, magic])
+    bits = ((np.asarray(codes)[:, np.newaxis] >> np.arange(9, -1, -1)) & 1).ravel()
+    runs = np.diff(np.concatenate(([0], np.flatnonzero(np.diff(bits)) + 1, [len(bits)])))
+    return [int(n) - 1 for n in runs[1:-1]]
+
+# Preamble patterns (indices into the timing profile) that mark the start of
+# a message, one per direction. Both contain the same pulse classes.
+init_sequences = [preamble_sequence(magic_m2s), preamble_sequence(magic_s2m)]
+preamble_length = max(len(seq) for seq in init_sequences)
+preamble_classes = sorted(set(init_sequences[0]))
+assert all(sorted(set(seq)) == preamble_classes for seq in init_sequences)
+
+default_timing_config = [1, 2, 3, 4, 5]
+
+# Sample formats for raw binary captures.
+sample_formats = {"int8": np.int8, "int16": np.int16, "float32": np.float32}
+
+# Number of samples (or pulses) that are processed at once.
+default_chunksize = 1 << 22
+
+def open_samples(filename, fmt=None):
+    """
+    Memory-maps a binary capture. .npy files are opened with np.load(), other
+    files are raw samples in the given format (see sample_formats).
+    """
+    if filename.endswith(".npy"):
+        samples = np.load(filename, mmap_mode="r")
+        if samples.ndim != 1:
+            raise ValueError("Expected a one-dimensional array in '%s'." % filename)
+        return samples
+    if fmt not in sample_formats:
+        raise ValueError("Unknown sample format '%s'." % fmt)
+    return np.memmap(filename, dtype=sample_formats[fmt], mode="r")
+
+def read_stream(f, fmt=None, chunksize=default_chunksize, follow=False, poll=0.1):
+    """
+    Yields float32 arrays with the samples read from the file object f as
+    they become available (at most chunksize samples at a time). fmt is the
+    format of raw binary samples (see sample_formats), None for text with one
+    sample per line. With follow set, the generator waits for more data at
+    the end of the file instead of stopping (like "tail -f").
+    """
+    itemsize = np.dtype(sample_formats[fmt]).itemsize if fmt is not None else None
+    rest = b""
+    while True:
+        data = os.read(f.fileno(), chunksize * (itemsize or 16))
+        if not data:
+            if follow:
+                time.sleep(poll)
+                continue
+            break
+        data = rest + data
+        if itemsize is not None:
+            n = len(data) // itemsize * itemsize
+            samples = np.frombuffer(data[:n], dtype=sample_formats[fmt])
+        else:
+            n = data.rfind(b"\n") + 1
+            samples = np.array(data[:n].split(), dtype=np.float64)
+        rest = data[n:]
+        if len(samples):
+            yield samples.astype(np.float32)
+    if itemsize is None and rest.strip():
+        yield np.array(rest.split(), dtype=np.float64).astype(np.float32)
+
+def sample_range(samples, chunksize=default_chunksize):
+    """
+    Returns the minimum and maximum sample as float32, reading the samples in
+    chunks of chunksize.
+    """
+    lo, hi = np.float32(np.inf), np.float32(-np.inf)
+    for start in range(0, len(samples), chunksize):
+        chunk = np.asarray(samples[start:start+chunksize], dtype=np.float32)
+        lo, hi = min(lo, chunk.min()), max(hi, chunk.max())
+    return lo, hi
+
+def about_equal(a, b):
+    """
+    Vectorized version of PonyAnalyzer::about_equal(). a and b are float32
+    values or arrays, the comparison is done in double precision.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return ~(a*0.9 > b) & ~(a < b*0.9)
+
+def extract_pulses(samples, trigger, chunksize=default_chunksize):
+    """
+    Returns the run lengths of the samples below and above the trigger level.
+    Even indices are low pulses and odd indices are high pulses, so the first
+    entry is zero if the waveform starts high. The samples are read in chunks
+    of chunksize, a pulse that crosses a chunk boundary is joined.
+    """
+    parts = list()
+    level, run = False, 0
+    for start in range(0, len(samples), chunksize):
+        high = ~(np.asarray(samples[start:start+chunksize], dtype=np.float32) < trigger)
+        if high[0] != level:
+            parts.append([run])
+            run = 0
+        edges = np.flatnonzero(high[1:] != high[:-1]) + 1
+        runs = np.diff(np.concatenate(([0], edges, [len(high)])))
+        runs[0] += run
+        parts.append(runs[:-1])
+        level, run = high[-1], runs[-1]
+    parts.append([run])
+    return np.concatenate(parts).astype(np.int32)
+
+class HysteresisTrigger:
+    """
+    Adaptive trigger for streaming mode. The upper and lower envelope of the
+    signal follow the peaks immediately and decay towards each other by the
+    current amplitude over window samples, so the trigger level (the middle
+    between them) follows baseline wander. A sample must cross the trigger
+    level by hysteresis times the amplitude to change the line level. The
+    amplitude is kept above min_swing times the largest amplitude seen, so
+    noise on an idle line does not produce pulses.
+    """
+
+    def __init__(self, window=4096, hysteresis=0.1, min_swing=0.5):
+        self.window = window
+        self.hysteresis = hysteresis
+        self.min_swing = min_swing
+        self.upper = self.lower = None
+        self.swing = 0.0
+        self.level = False
+
+    def levels(self, samples):
+        """
+        Returns the line level (True for high) for each sample.
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        if len(x) == 0:
+            return np.zeros(0, dtype=bool)
+        if self.upper is None:
+            self.upper, self.lower = x.max(), x.min()
+
+        # upper[n] = max(x[n], upper[n-1] - decay) as a cumulative maximum
+        decay = (self.upper - self.lower) / self.window
+        ramp = decay * np.arange(1, len(x) + 1)
+        upper = np.maximum.accumulate(np.concatenate(([self.upper], x + ramp)))[1:] - ramp
+        lower = np.minimum.accumulate(np.concatenate(([self.lower], x - ramp)))[1:] + ramp
+
+        self.swing = max(self.swing, np.max(upper - lower))
+        middle = (upper + lower) / 2
+        half = np.maximum(upper - lower, self.min_swing * self.swing) / 2
+        upper, lower = np.maximum(upper, middle + half), np.minimum(lower, middle - half)
+        self.upper, self.lower = upper[-1], lower[-1]
+
+        # samples within the hysteresis band keep the previous level
+        band = self.hysteresis * (upper - lower)
+        high = x >= middle + band
+        decided = high | (x < middle - band)
+        last = np.maximum.accumulate(np.where(decided, np.arange(len(x)), -1))
+        levels = np.where(last >= 0, high[np.maximum(last, 0)], self.level)
+        self.level = levels[-1]
+        return levels
+
+def match_preamble(pulses, timing_config, lookahead=20):
+    """
+    Returns the indices of all pulses that start a preamble for the given
+    timing profile and the base width estimated for each of them (float32).
+    Offsets in the last lookahead pulses are not checked (analyzer.cc stops
+    20 pulses before the end, the preamble itself is 14 pulses long).
+    """
+    pulses = np.asarray(pulses, dtype=np.int64)
+    noffsets = len(pulses) - lookahead
+    if noffsets <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    tc = np.asarray(timing_config, dtype=np.float32)
+    fpulses = pulses.astype(np.float32)
+    window = pulses[:noffsets] + pulses[1:noffsets+1] + pulses[2:noffsets+2] + pulses[3:noffsets+3]
+    base_width = (window / 4.0 / np.float64(tc[0])).astype(np.float32)
+
+    match = np.zeros(noffsets, dtype=bool)
+    for seq in init_sequences:
+        seqmatch = np.ones(noffsets, dtype=bool)
+        for n, t in enumerate(seq):
+            seqmatch &= about_equal(tc[t] * base_width, fpulses[n:n+noffsets])
+        match |= seqmatch
+    index = np.flatnonzero(match)
+    return index, base_width[index]
+
+def find_preambles(pulses, tolerance=0.15, chunksize=default_chunksize):
+    """
+    Locates preambles without knowing the timing profile: the pulses of each
+    class in one of the init_sequences must be within tolerance of the class
+    mean and the classes must be ordered by width. Returns the sorted indices
+    of the first preamble pulse and an array with the mean widths of the
+    preamble_classes for each preamble.
+    """
+    classes = preamble_classes
+    found, widths = list(), list()
+    for first in range(0, max(len(pulses) - preamble_length + 1, 0), chunksize):
+        p = np.asarray(pulses[first:first+chunksize+preamble_length-1], dtype=np.float64)
+        noffsets = len(p) - preamble_length + 1
+        for seq in init_sequences:
+            means = list()
+            for c in classes:
+                members = [n for n, t in enumerate(seq) if t == c]
+                means.append(sum(p[n:n+noffsets] for n in members) / len(members))
+            match = np.ones(noffsets, dtype=bool)
+            for n, t in enumerate(seq):
+                m = means[classes.index(t)]
+                match &= np.abs(p[n:n+noffsets] - m) <= tolerance * m
+            for k in range(1, len(classes)):
+                match &= means[k] > means[k-1] * (1 + tolerance)
+            index = np.flatnonzero(match)
+            found.append(first + index)
+            widths.append(np.array([m[index] for m in means]).T.reshape(-1, len(classes)))
+    if not found:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(classes)))
+    index, widths = np.concatenate(found), np.concatenate(widths)
+    order = np.argsort(index, kind="stable")
+    return index[order], widths[order]
+
+def kmeans_1d(values, weights, centers, iterations=100):
+    """
+    Weighted 1-D k-means of values (sorted), starting with the given centers.
+    Returns the centers and the total weight of each cluster.
+    """
+    centers = np.array(centers, dtype=np.float64)
+    for i in range(iterations):
+        assign = np.searchsorted((centers[1:] + centers[:-1]) / 2, values)
+        counts = np.bincount(assign, weights, len(centers))
+        sums = np.bincount(assign, weights * values, len(centers))
+        new_centers = np.where(counts > 0, sums / np.maximum(counts, 1), centers)
+        if np.allclose(new_centers, centers):
+            break
+        centers = np.sort(new_centers)
+    return centers, counts
+
+def fit_timings(widths, maxtiming=64, tolerance=0.05):
+    """
+    Returns the smallest integer timings (and the matching cycle width) that
+    reproduce the ratios of the measured class widths within tolerance. If
+    none is found up to maxtiming for the first class, the best fit is used.
+    """
+    widths = np.asarray(widths, dtype=np.float64)
+    best = None
+    for t0 in range(1, maxtiming+1):
+        timings = np.maximum(np.round(widths / widths[0] * t0), 1)
+        cycle = np.dot(widths, timings) / np.dot(timings, timings)
+        error = np.max(np.abs(widths - timings * cycle) / (timings * cycle))
+        if np.any(np.diff(timings) <= 0):
+            continue
+        if best is None or error < best[2]:
+            best = (timings, cycle, error)
+        if error < tolerance:
+            break
+    return [int(t) for t in best[0]], best[1]
+
+def infer_timing_profiles(pulses, tolerance=0.15, chunksize=default_chunksize):
+    """
+    Infers the timing profile of each direction found in the capture. The
+    preambles (see find_preambles()) are grouped by the width of their single
+    bit pulses. For each group, the widths of all pulses up to the end of
+    each message are clustered into the 5 pulse classes, starting with the
+    widths measured in the preambles (the 2 bit class is not part of the
+    preamble and starts between the 1 and 3 bit classes). Returns a list of
+    TimingProfile tuples, ordered by cycle width.
+    """
+    index, widths = find_preambles(pulses, tolerance, chunksize)
+    if len(index) == 0:
+        return list()
+    order = np.argsort(widths[:, 0], kind="stable")
+    splits = np.flatnonzero(widths[order[1:], 0] > widths[order[:-1], 0] * (1 + tolerance)) + 1
+
+    profiles = list()
+    for group in np.split(order, splits):
+        start = np.sort(index[group]) + preamble_length
+        w = np.median(widths[group], axis=0)
+        lo, hi = 0.5 * w[0], 1.5 * w[-1]
+
+        # pulses from the end of each preamble up to the first pulse that is
+        # out of range for this group (usually the idle line)
+        bad = [np.zeros(0, dtype=np.int64)]
+        for first in range(0, len(pulses), chunksize):
+            p = np.asarray(pulses[first:first+chunksize])
+            bad.append(first + np.flatnonzero((p < lo) | (p > hi)))
+        bad = np.concatenate(bad + [[len(pulses)]])
+        stop = bad[np.searchsorted(bad, start)]
+        mask = np.zeros(len(pulses) + 1, dtype=np.int64)
+        np.add.at(mask, start, 1)
+        np.add.at(mask, stop, -1)
+
+        # histogram of the pulse widths within the messages
+        hist = np.zeros(int(hi) + 1, dtype=np.int64)
+        depth = 0
+        for first in range(0, len(pulses), chunksize):
+            inside = depth + np.cumsum(mask[first:min(first+chunksize, len(pulses))])
+            depth = inside[-1]
+            p = np.asarray(pulses[first:first+chunksize])[inside > 0]
+            hist += np.bincount(p, minlength=len(hist))
+        values = np.flatnonzero(hist)
+        counts = hist[values]
+
+        centers = np.interp(np.arange(5), preamble_classes, w)
+        centers, totals = kmeans_1d(values.astype(np.float64), counts.astype(np.float64), centers)
+        timings, cycle = fit_timings(centers, tolerance=tolerance/3)
+        profiles.append(TimingProfile(timings, cycle, tuple(centers), tuple(int(t) for t in totals), len(group)))
+    return profiles
+
+def preamble_directions(pulses, messages, timing_configs):
+    """
+    Returns the direction of each message (arguments of decode_message()):
+    the index of the entry in init_sequences that its preamble matches, 0
+    for master to slave and 1 for slave to master.
+    """
+    directions = np.zeros(len(messages), dtype=np.int64)
+    for m, (_, msg, _) in enumerate(messages):
+        tc = np.asarray(timing_configs[msg.timing_cfg], dtype=np.float32)
+        p = np.asarray(pulses[msg.start_index:msg.start_index+preamble_length]).astype(np.float32)
+        for d, seq in enumerate(init_sequences):
+            if len(p) == len(seq) and np.all(about_equal(tc[seq] * np.float32(msg.base_width), p)):
+                directions[m] = d
+                break
+    return directions
+
+def classify_message_pulses(pulses, messages, timing_configs, chunksize=default_chunksize):
+    """
+    Classifies the pulses of the messages (arguments of decode_message())
+    like the decoder: from the pulse after the start pulse up to the first
+    pulse that does not match the timing profile of the message (or the start
+    of the next message).
+
+    Returns a tuple (histograms, margins) of dicts indexed by (timing profile,
+    direction, pulse class), see preamble_directions(): histograms holds the number of pulses for each width in
+    samples, margins the smallest distance (in samples) of a pulse width to
+    the limits of about_equal().
+    """
+    histograms, margins = dict(), dict()
+    if len(messages) == 0:
+        return histograms, margins
+
+    starts = np.array([msg.start_index for _, msg, _ in messages], dtype=np.int64)
+    stops = np.array([stop for _, _, stop in messages], dtype=np.int64)
+    profiles = np.array([msg.timing_cfg for _, msg, _ in messages]) * len(init_sequences)
+    profiles += preamble_directions(pulses, messages, timing_configs)
+    maxlen = max(len(tc) for tc in timing_configs)
+    widths = np.full((len(messages), maxlen), -1, dtype=np.float32)
+    for m, (_, msg, _) in enumerate(messages):
+        tc = timing_configs[msg.timing_cfg]
+        widths[m, :len(tc)] = np.asarray(tc, dtype=np.float32) * np.float32(msg.base_width)
+
+    a = 0
+    while a < len(messages):
+        b = max(int(np.searchsorted(stops, starts[a] + chunksize, side="right")), a + 1)
+        index = np.arange(starts[a] + 1, stops[b-1])
+        m = np.searchsorted(starts[a:b], index, side="right") - 1
+        p = np.asarray(pulses[starts[a]+1:stops[b-1]]).astype(np.float32)
+        inside = index > starts[a:b][m]
+        matches = about_equal(widths[a:b][m], p[:, np.newaxis])
+        matched = np.any(matches, axis=1)
+
+        # pulses after the first unmatched pulse of a message are not decoded
+        end = stops[a:b].copy()
+        bad = np.flatnonzero(inside & ~matched)
+        mbad, first = np.unique(m[bad], return_index=True)
+        end[mbad] = index[bad[first]]
+        valid = inside & matched & (index < end[m])
+
+        m, p = m[valid], p[valid]
+        cls = np.argmax(matches[valid], axis=1)
+        w = widths[a:b][m, cls].astype(np.float64)
+        margin = np.minimum(p - w*0.9, w/0.9 - p)
+        key = profiles[a:b][m] * maxlen + cls
+        for kc in np.unique(key).tolist():
+            sel = key == kc
+            k = divmod(kc // maxlen, len(init_sequences)) + (kc % maxlen,)
+            hist = np.bincount(p[sel].astype(np.int64))
+            old = histograms.get(k, np.zeros(0, dtype=np.int64))
+            if len(old) < len(hist):
+                old, hist = hist, old
+            old[:len(hist)] += hist
+            histograms[k] = old
+            margins[k] = min(margins.get(k, np.inf), float(margin[sel].min()))
+        a = b
+    return histograms, margins
+
+def jitter_statistics(histograms, margins, timing_configs, sample_period=1.0, receivers=None):
+    """
+    Computes the pulse width statistics for the result of
+    classify_message_pulses() and returns them as a list of dicts (one entry
+    per direction and timing profile, see PonyAnalyzer.jitter_report()).
+    Both directions usually share one timing profile but run at different
+    cycle widths, so each entry has its own fitted cycle. Times are in ns for
+    a capture with the given sample period.
+
+    The cycle width is fitted with timings.fit_cycle(). The measured width
+    of a pulse includes the timings.quantization_variance, which is
+    subtracted for the jitter estimate. The pulse jitter is the RMS deviation
+    of the pulse widths (the pulse_jitter of timings.py is the peak deviation
+    from the nominal width), the edge jitter is that value divided by
+    sqrt(2) (independent jitter of both edges).
+
+    receivers optionally maps directions to (recv_period, pulse_jitter) in
+    ns. For these directions the sample windows of
+    TimingSolver.test_recv_timings() are computed with the measured cycle
+    width as transmit period and the timing profile as transmit timings. A
+    pulse of class k is decoded correctly by the receiver if its duration is
+    in [minsamples * recv_period, maxsamples * recv_period), the margin is the
+    distance of the shortest and longest measured pulses to these limits.
+    """
+    solver = TimingSolver()
+    profiles = list()
+    for d, k in sorted(set((d, k) for k, d, _ in histograms)):
+        tc = timing_configs[k]
+        classes = [c for c in range(len(tc)) if (k, d, c) in histograms]
+        moments = dict((c, histogram_moments(histograms[k, d, c])) for c in classes)
+        cycle = fit_cycle([moments[c][0] for c in classes], [moments[c][1] for c in classes], [tc[c] for c in classes])
+        count = sum(moments[c][0] for c in classes)
+        variance = max(sum(moments[c][0] * moments[c][2] for c in classes) / count - quantization_variance, 0)
+
+        profile = dict(profile=k, direction=d, timings=list(tc), pulses=count, cycle=cycle,
+                transmit_period=cycle * sample_period,
+                pulse_jitter_rms=np.sqrt(variance) * sample_period,
+                edge_jitter_rms=np.sqrt(variance / 2) * sample_period,
+                classes=list())
+
+        windows = None
+        if receivers is not None and d in receivers:
+            recv_period, pulse_jitter = receivers[d]
+            config = solver.make_config(cycle * sample_period, recv_period, pulse_jitter, tc)
+            collision = len(solver.test_recv_timings(cycle * sample_period, recv_period, pulse_jitter, tc, False)) == 0
+            windows = [(lo * recv_period, hi * recv_period) for lo, hi in config.sample_windows]
+            profile["receiver"] = dict(recv_period=recv_period, pulse_jitter=pulse_jitter,
+                    sample_windows=[list(w) for w in config.sample_windows], collision=collision,
+                    max_pulse_jitter=solver.jitter_margin(cycle * sample_period, recv_period, tc)[0])
+
+        peak = 0
+        for c in classes:
+            n, mean, var, lo, hi = moments[c]
+            nominal = tc[c] * cycle
+            entry = dict(bits=c+1, timing=tc[c], count=n,
+                    nominal=nominal * sample_period, mean=mean * sample_period,
+                    std=np.sqrt(var) * sample_period, min=lo * sample_period, max=hi * sample_period,
+                    jitter_rms=np.sqrt(max(var - quantization_variance, 0)) * sample_period,
+                    peak_deviation=max(nominal - lo, hi - nominal) * sample_period,
+                    analyzer_margin=margins[k, d, c] * sample_period,
+                    histogram=dict(first=lo, counts=histograms[k, d, c][lo:hi+1].tolist()))
+            peak = max(peak, entry["peak_deviation"])
+            if windows is not None:
+                wlo, whi = windows[c]
+                entry["window"] = [wlo, whi]
+                entry["margin"] = min(lo * sample_period - wlo, whi - hi * sample_period)
+                std = np.sqrt(var) * sample_period
+                entry["margin_sigma"] = (min(mean * sample_period - wlo, whi - mean * sample_period) / std) if std > 0 else None
+            profile["classes"].append(entry)
+        profile["pulse_jitter_peak"] = peak
+        profiles.append(profile)
+    return profiles
+
+def decode_8b10b(symbol):
+    """
+    Returns the name and value of a 10 bit symbol (bit 9 is sent first) as
+    printed by analyzer.cc.
+    """
+    bits = format(symbol & 0x3ff, "010b")
+    abcdei, fghj = bits[:6], bits[6:]
+    symbol_name = ""
+    val_upper, val_lower = -1, -1
+
+    for codes, name, value in lower_codes:
+        if abcdei in codes:
+            symbol_name, val_lower = name, value
+
+    if symbol_name[:1] == "D":
+        for codes, name, value in upper_codes_d:
+            if fghj in codes:
+                symbol_name += name
+                val_upper = value
+
+    if symbol_name[:1] == "K":
+        for codes, name, value in upper_codes_k:
+            if fghj in codes:
+                symbol_name += name
+                val_upper = value
+
+    if symbol_name == "K.28.2 .5 ":
+        if abcdei+fghj in ("0011110101", "1100001010"):
+            symbol_name, val_upper = "K.28.2 ", 2 + 8
+        if abcdei+fghj in ("0011111010", "1100000101"):
+            symbol_name, val_upper = "K.28.5 ", 5 + 8
+
+    value = (val_upper << 5) | val_lower
+    return symbol_name + " %3d %3x" % (value, value & 0xffffffff)
+
+lower_codes = [
+    (("100111", "011000"), "D.00",  0),
+    (("011101", "100010"), "D.01",  1),
+    (("101101", "010010"), "D.02",  2),
+    (("110001",          ), "D.03",  3),
+    (("110101", "001010"), "D.04",  4),
+    (("101001",          ), "D.05",  5),
+    (("011001",          ), "D.06",  6),
+    (("111000", "000111"), "D.07",  7),
+    (("111001", "000110"), "D.08",  8),
+    (("100101",          ), "D.09",  9),
+    (("010101",          ), "D.10", 10),
+    (("110100",          ), "D.11", 11),
+    (("001101",          ), "D.12", 12),
+    (("101100",          ), "D.13", 13),
+    (("011100",          ), "D.14", 14),
+    (("010111", "101000"), "D.15", 15),
+    (("011011", "100100"), "D.16", 16),
+    (("100011",          ), "D.17", 17),
+    (("010011",          ), "D.18", 18),
+    (("110010",          ), "D.19", 19),
+    (("001011",          ), "D.20", 20),
+    (("101010",          ), "D.21", 21),
+    (("011010",          ), "D.22", 22),
+    (("111010", "000101"), "D.23", 23),
+    (("110011", "001100"), "D.24", 24),
+    (("100110",          ), "D.25", 25),
+    (("010110",          ), "D.26", 26),
+    (("110110", "001001"), "D.27", 27),
+    (("001110",          ), "D.28", 28),
+    (("001111", "110000"), "K.28", 28),
+    (("101110", "010001"), "D.29", 29),
+    (("011110", "100001"), "D.30", 30),
+    (("101011", "010100"), "D.31", 31),
+]
+
+upper_codes_d = [
+    (("1011", "0100"), ".0 ", 0),
+    (("1001",       ), ".1 ", 1),
+    (("0101",       ), ".2 ", 2),
+    (("1100", "0011"), ".3 ", 3),
+    (("1101", "0010"), ".4 ", 4),
+    (("1010",       ), ".5 ", 5),
+    (("0110",       ), ".6 ", 6),
+    (("1110", "0001"), ".P7", 7),
+    (("0111", "1000"), ".A7", 7),
+]
+
+upper_codes_k = [
+    (("1011", "0100"), ".0 ", 0 + 8),
+    (("0110", "1001"), ".1 ", 1 + 8),
+    (("1010", "0101"), ".2 ", 2 + 8),
+    (("1100", "0011"), ".3 ", 3 + 8),
+    (("1101", "0010"), ".4 ", 4 + 8),
+    (("0101", "1010"), ".5 ", 5 + 8),
+    (("1001", "0110"), ".6 ", 6 + 8),
+    (("0111", "1000"), ".7 ", 7 + 8),
+]
+
+# Output line for each of the 1024 symbols.
+symbol_lines = ["  %s %s" % (format(s, "010b"), decode_8b10b(s)) for s in range(1024)]
+
+class PonyAnalyzer:
+    def __init__(self, timing_configs=None, chunksize=default_chunksize, protocol=None):
+        self.messages = list()
+        self.samples = np.zeros(0, dtype=np.float32)
+        self.pulses = np.zeros(1, dtype=np.int32)
+        self.timing_configs = list() if timing_configs is None else [list(tc) for tc in timing_configs]
+        self.chunksize = chunksize
+        self.max_sample = self.min_sample = self.trigger = np.float32(0)
+
+        # decoder state (see decode_segment())
+        self.buffer = 0
+        self.buffer_n = 0
+        self.active = False
+        self.waiting = False
+
+        # optional ProtocolDecoder (see protocol.py) and the code words of the
+        # current message
+        self.protocol = protocol
+        self.message_codes = list()
+
+    def read_samples(self, filename):
+        try:
+            with open(filename) as f:
+                tokens = f.read().split()
+        except IOError:
+            sys.stderr.write("Can't open input file '%s'!\n" % filename)
+            sys.exit(1)
+
+        # like "f >> sample", stop at the first token that is not a number
+        try:
+            self.samples = np.array(tokens, dtype=np.float64).astype(np.float32)
+        except ValueError:
+            values = list()
+            for t in tokens:
+                try:
+                    values.append(float(t))
+                except ValueError:
+                    break
+            self.samples = np.array(values, dtype=np.float64).astype(np.float32)
+
+        if len(self.samples):
+            self.max_sample = self.samples.max()
+            self.min_sample = self.samples.min()
+            self.trigger = np.float32((self.max_sample + self.min_sample) * 0.5)
+
+    def map_samples(self, filename, fmt=None):
+        try:
+            self.samples = open_samples(filename, fmt)
+        except IOError:
+            sys.stderr.write("Can't open input file '%s'!\n" % filename)
+            sys.exit(1)
+
+        if len(self.samples):
+            self.min_sample, self.max_sample = sample_range(self.samples, self.chunksize)
+            self.trigger = np.float32((self.max_sample + self.min_sample) * 0.5)
+
+    def extract_pulses(self):
+        self.pulses = extract_pulses(self.samples, self.trigger, self.chunksize)
+
+    def infer_timing_configs(self, out=sys.stdout):
+        """
+        Replaces the timing profiles with the profiles inferred from the
+        pulses (see infer_timing_profiles()). Directions with the same profile
+        share one entry. Keeps the current profiles if no preamble is found.
+        """
+        profiles = infer_timing_profiles(self.pulses, chunksize=self.chunksize)
+        configs = list()
+        for d, p in enumerate(profiles):
+            out.write("Direction #%d: %d preambles, timing profile %s with cycle width %g (pulse widths %s).\n" %
+                    (d, p.npreambles, p.timings, p.cycle, " ".join("%.2f" % w for w in p.widths)))
+            if p.timings not in configs:
+                configs.append(p.timings)
+        if configs:
+            self.timing_configs = configs
+        else:
+            out.write("No preambles found, keeping the timing profiles %s.\n" % self.timing_configs)
+        return profiles
+
+    def find_messages(self, out=sys.stdout, pool=None):
+        """
+        Finds the preambles of all messages. With a PulsePool the chunks of
+        pulses are searched by the worker processes.
+        """
+        # chunks of pulses overlap by the 20 pulses needed to match a preamble
+        chunks = list(range(0, max(len(self.pulses) - 20, 0), self.chunksize))
+        if pool is None:
+            results = (find_preambles_chunk(self.pulses[first:first+self.chunksize+20], self.timing_configs) for first in chunks)
+        else:
+            results = pool.imap(find_messages_chunk, [(first, self.chunksize, self.timing_configs) for first in chunks])
+
+        pos = 0
+        for first, found in zip(chunks, results):
+            pulses = self.pulses[first:first+self.chunksize+20]
+            positions = pos + np.concatenate(([0], np.cumsum(pulses, dtype=np.int64)))
+            for i, k, w in found:
+                out.write("Message #%d: Start at sample %d (pulse %d) with timing profile %d and base width %g.\n" %
+                        (len(self.messages), positions[i], first + i, k, w))
+                self.messages.append(Message(first + i, k, w))
+            pos = positions[min(self.chunksize, len(pulses))]
+
+    def decode_segment(self, first, pulses, tmconfig, base_width):
+        """
+        Feeds the pulses of a message (starting at pulse index first) into the
+        bit buffer. Stops at the first pulse that does not match the timing
+        profile. Returns a tuple (codes, ended) with the array of decoded 10
+        bit code words and a flag that is set if the message ended.
+        """
+        codes = [np.zeros(0, dtype=np.int64)]
+        widths = np.asarray(tmconfig, dtype=np.float32) * np.float32(base_width)
+        fpulses = np.asarray(pulses).astype(np.float32)
+        matches = about_equal(widths[np.newaxis, :], fpulses[:, np.newaxis])
+        nbits = np.argmax(matches, axis=1) + 1
+        unmatched = np.flatnonzero(~np.any(matches, axis=1))
+        end = unmatched[0] if len(unmatched) else len(pulses)
+        nbits = nbits[:end]
+
+        # bit stream: the bits still in the buffer followed by the new bits
+        ncarry = min(self.buffer_n, 32)
+        carry = (self.buffer >> np.arange(ncarry-1, -1, -1)) & 1
+        levels = (np.arange(first, first+end) % 2).astype(np.uint8)
+        stream = np.concatenate((carry.astype(np.uint8), np.repeat(levels, nbits)))
+        ends = ncarry + np.cumsum(nbits)
+        counts = self.buffer_n + np.cumsum(nbits)
+        if self.active:
+            # symbols are still emitted with the old alignment until the next comma
+            counts -= 10 * (np.concatenate(([self.buffer_n], counts[:-1])) // 10)
+
+        def emit(start, stop):
+            nsym = (stop - start) // 10
+            if nsym > 0:
+                words = stream[start:start+10*nsym].reshape(nsym, 10)
+                codes.append(words.dot(1 << np.arange(9, -1, -1)))
+            return start + 10*nsym
+
+        comma = None
+        if self.waiting and end > 0:
+            valid = np.flatnonzero(counts >= 10)
+            if len(valid):
+                last7 = stream[ends[valid, np.newaxis] - 7 + np.arange(7)].dot(1 << np.arange(6, -1, -1))
+                hits = valid[last7 == 0x1f]
+                if len(hits):
+                    comma = hits[0]
+
+        start = ncarry - self.buffer_n if self.active else None
+        if comma is not None:
+            if self.active:
+                emit(start, ends[comma-1] if comma > 0 else ncarry)
+            self.active, self.waiting = True, False
+            start = ends[comma] - 7
+        if self.active:
+            start = emit(start, len(stream))
+            self.buffer_n = len(stream) - start
+        else:
+            self.buffer_n += len(stream) - ncarry
+
+        tail = stream[ncarry:][-32:]
+        self.buffer = (self.buffer << len(tail) | int(tail.dot(1 << np.arange(len(tail)-1, -1, -1)))) & 0xffffffff
+
+        if end < len(pulses):
+            self.active = self.waiting = False
+        return np.concatenate(codes), end < len(pulses)
+
+    def write_segment(self, out, codes, ended):
+        """
+        Writes the decoded code words of a message, either as symbol dump or
+        (with a protocol decoder set) collected until the message ends and
+        decoded as packets.
+        """
+        if self.protocol is None:
+            lines = [symbol_lines[c] for c in codes.tolist()]
+        else:
+            self.message_codes.append(codes)
+            lines = self.flush_protocol() if ended else []
+        if ended:
+            lines.append("  END-OF-MESSAGE")
+        if lines:
+            out.write("\n".join(lines) + "\n")
+
+    def flush_protocol(self):
+        if self.protocol is None or not self.message_codes:
+            return []
+        codes = np.concatenate(self.message_codes)
+        self.message_codes = list()
+        return self.protocol.decode_message(codes)
+
+    def used_messages(self):
+        """
+        Returns the number of messages that are decoded: like analyzer.cc,
+        stop looking for message starts after a start index that is found for
+        more than one timing profile.
+        """
+        for m in range(1, len(self.messages)):
+            if self.messages[m].start_index == self.messages[m-1].start_index:
+                return m
+        return len(self.messages)
+
+    def decoder_state(self):
+        return (self.buffer, self.buffer_n, self.active, self.waiting)
+
+    def set_decoder_state(self, state):
+        self.buffer, self.buffer_n, self.active, self.waiting = state
+
+    def decode_message(self, out, m, msg, stop):
+        """
+        Decodes message number m (a Message tuple) up to the pulse index stop
+        (the start of the next message).
+        """
+        lines = self.flush_protocol()
+        if lines:
+            out.write("\n".join(lines) + "\n")
+        out.write("Message #%d:\n  Using timing profile %d and base width %g.\n" % (m, msg.timing_cfg, msg.base_width))
+        self.waiting = True
+        for first in range(msg.start_index + 1, stop, self.chunksize):
+            codes, ended = self.decode_segment(first, self.pulses[first:min(first+self.chunksize, stop)],
+                    self.timing_configs[msg.timing_cfg], msg.base_width)
+            self.write_segment(out, codes, ended)
+            if ended:
+                break
+
+    def message_list(self):
+        """
+        Returns the arguments of decode_message() for all used messages.
+        """
+        nused = self.used_messages()
+        starts = [msg.start_index for msg in self.messages[1:nused]] + [len(self.pulses)]
+        return [(m, self.messages[m], starts[m]) for m in range(nused)]
+
+    def decode_messages(self, out=sys.stdout, pool=None, ngroups=None):
+        """
+        Decodes all messages found by find_messages(). With a PulsePool the
+        messages are split into ngroups groups (default: four per process)
+        with about the same number of pulses, which are decoded by the worker
+        processes and merged in order.
+
+        The decoder state carries over from one message to the next, so each
+        worker starts one message early to get the state at the start of its
+        group (see decode_group()). In the rare case that this state differs
+        from the state at the end of the previous group the group is decoded
+        again in this process, so the output does not depend on the pool.
+        Protocol decoding (which depends on all previous packets) runs in this
+        process on the code words recorded by the workers.
+        """
+        messages = self.message_list()
+        if pool is None:
+            for m, msg, stop in messages:
+                self.decode_message(out, m, msg, stop)
+        elif messages:
+            if ngroups is None:
+                ngroups = 4 * pool.nprocs
+            starts = np.array([msg.start_index for _, msg, _ in messages])
+            bounds = np.searchsorted(starts, np.linspace(0, len(self.pulses), ngroups + 1)[1:-1])
+            bounds = [0] + sorted(set(b for b in bounds.tolist() if 0 < b < len(messages))) + [len(messages)]
+
+            config = (self.timing_configs, self.chunksize, self.protocol is not None)
+            tasks = [config + (messages[:bounds[1]], self.decoder_state())]
+            tasks += [config + (messages[a-1:b], None) for a, b in zip(bounds[1:-1], bounds[2:])]
+
+            state = None
+            for k, result in enumerate(pool.imap(decode_group, tasks)):
+                initial, final, recorded = result
+                if k > 0 and initial != state:
+                    initial, final, recorded = decode_group((pool.filename, pool.npulses) + config + (tasks[k][-2][1:], state))
+                self.replay(out, recorded)
+                state = final
+            self.set_decoder_state(state)
+
+        lines = self.flush_protocol()
+        if lines:
+            out.write("\n".join(lines) + "\n")
+
+    def jitter_report(self, sample_period=1.0, receivers=None):
+        """
+        Returns the pulse width statistics of all decoded messages as a dict
+        that can be written as JSON (see jitter_statistics()).
+        """
+        histograms, margins = classify_message_pulses(self.pulses, self.message_list(),
+                self.timing_configs, self.chunksize)
+        return dict(sample_period=sample_period,
+                profiles=jitter_statistics(histograms, margins, self.timing_configs, sample_period, receivers))
+
+    def replay(self, out, recorded):
+        """
+        Writes the output recorded by decode_group() and decodes the recorded
+        code words with the protocol decoder.
+        """
+        for item in recorded:
+            if isinstance(item, str):
+                out.write(item)
+            else:
+                lines = self.protocol.decode_message(item)
+                if lines:
+                    out.write("\n".join(lines) + "\n")
+
+class PulsePool:
+    """
+    Pool of worker processes (default: one per CPU) that read the pulses from
+    a shared memory-mapped temporary file. The tasks passed to imap() get the
+    file name and the number of pulses prepended. close() removes the file.
+    """
+
+    def __init__(self, pulses, nprocs=None):
+        fd, self.filename = tempfile.mkstemp(suffix=".pulses")
+        os.close(fd)
+        np.asarray(pulses, dtype=np.int32).tofile(self.filename)
+        self.npulses = len(pulses)
+        self.nprocs = multiprocessing.cpu_count() if nprocs is None else nprocs
+        self.pool = multiprocessing.Pool(self.nprocs)
+
+    def imap(self, func, tasks):
+        return self.pool.imap(func, [(self.filename, self.npulses) + tuple(t) for t in tasks])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        os.remove(self.filename)
+
+def map_pulses(filename, npulses):
+    return np.memmap(filename, dtype=np.int32, mode="r", shape=(npulses,))
+
+def find_preambles_chunk(pulses, timing_configs):
+    """
+    Returns the sorted list of (index, timing profile, base width) of the
+    preambles in a chunk of pulses.
+    """
+    found = list()
+    for k, tc in enumerate(timing_configs):
+        index, base_width = match_preamble(pulses, tc)
+        found.extend((i, k, w) for i, w in zip(index.tolist(), base_width))
+    found.sort(key=lambda m: m[:2])
+    return found
+
+def find_messages_chunk(task):
+    """
+    Worker function of PonyAnalyzer.find_messages().
+    """
+    filename, npulses, first, chunksize, timing_configs = task
+    return find_preambles_chunk(map_pulses(filename, npulses)[first:first+chunksize+20], timing_configs)
+
+class OutputRecorder:
+    """
+    Records the output of a PonyAnalyzer in a worker process. It is used as
+    output stream (records the text) and as protocol decoder (records the
+    code words of each message).
+    """
+
+    def __init__(self):
+        self.items = list()
+
+    def write(self, text):
+        self.items.append(text)
+
+    def decode_message(self, codes):
+        self.items.append(codes)
+        return []
+
+def decode_group(task):
+    """
+    Worker function of PonyAnalyzer.decode_messages(). Decodes a group of
+    messages (arguments of decode_message()) starting with the given decoder
+    state. If state is None the first message of the group only brings the
+    decoder into the state at the start of the next message and its output
+    is dropped.
+
+    Returns a tuple (initial state, final state, recorded output).
+    """
+    filename, npulses, timing_configs, chunksize, protocol, messages, state = task
+    pa = PonyAnalyzer(timing_configs, chunksize)
+    pa.pulses = map_pulses(filename, npulses)
+    recorder = OutputRecorder()
+    if state is None:
+        dropped = OutputRecorder()
+        pa.protocol = dropped if protocol else None
+        pa.decode_message(dropped, *messages[0])
+        pa.message_codes = list()
+        messages = messages[1:]
+    else:
+        pa.set_decoder_state(state)
+
+    if protocol:
+        pa.protocol = recorder
+    initial = pa.decoder_state()
+    for m in messages:
+        pa.decode_message(recorder, *m)
+    pa.flush_protocol()
+    return initial, pa.decoder_state(), recorder.items
+
+class PonyStreamAnalyzer(PonyAnalyzer):
+    """
+    Decodes a capture that is fed in chunks of samples (see feed()) with
+    bounded memory. Messages are printed as soon as the pulses following them
+    have been checked for the next preamble. A message that ends in an idle
+    line is terminated once the idle pulse is too long for the timing
+    profile, without waiting for the next edge. If a preamble matches more
+    than one timing profile, the first profile is used.
+    """
+
+    def __init__(self, timing_configs=None, window=4096, hysteresis=0.1, protocol=None):
+        PonyAnalyzer.__init__(self, timing_configs, protocol=protocol)
+        self.tracker = HysteresisTrigger(window, hysteresis)
+        self.nsamples = 0
+
+        # complete pulses that are not yet searched for preambles, starting
+        # with pulse index pending_index at sample pending_pos
+        self.pending = np.zeros(0, dtype=np.int64)
+        self.pending_index = 0
+        self.pending_pos = 0
+        self.searched = 0
+        self.decoded = 0
+
+        # the pulse in progress, provisional is set if it has already been
+        # decoded as the end of a message
+        self.level = False
+        self.run = 0
+        self.provisional = False
+        self.message = None
+        self.nmessages = 0
+
+    def feed(self, samples, out=sys.stdout):
+        levels = self.tracker.levels(samples)
+        self.nsamples += len(levels)
+        if len(levels) == 0:
+            return
+
+        if levels[0] != self.level:
+            self.close_pulse([self.run])
+            self.run = 0
+        edges = np.flatnonzero(levels[1:] != levels[:-1]) + 1
+        runs = np.diff(np.concatenate(([0], edges, [len(levels)])))
+        runs[0] += self.run
+        self.close_pulse(runs[:-1])
+        self.level, self.run = levels[-1], runs[-1]
+        self.process(out)
+
+        if (self.active or self.waiting) and not self.provisional:
+            longest = max(self.timing_configs[self.message.timing_cfg]) * self.message.base_width
+            if self.run > 2 * longest:
+                self.pending = np.concatenate((self.pending, [self.run]))
+                self.provisional = True
+                self.process(out, self.pending_index + len(self.pending))
+
+    def finish(self, out=sys.stdout):
+        """
+        Processes the remaining pulses at the end of the capture.
+        """
+        self.close_pulse([self.run])
+        self.run = 0
+        total = self.pending_index + len(self.pending)
+        self.process(out, total)
+        lines = self.flush_protocol()
+        if lines:
+            out.write("\n".join(lines) + "\n")
+
+    def close_pulse(self, runs):
+        runs = np.asarray(runs, dtype=np.int64)
+        if self.provisional and len(runs):
+            self.pending[-1] = runs[0]
+            runs = runs[1:]
+            self.provisional = False
+        self.pending = np.concatenate((self.pending, runs))
+
+    def process(self, out, decode_to=None):
+        nseq = preamble_length
+        total = self.pending_index + len(self.pending)
+        stop = max(total - nseq + 1, self.searched)
+        if decode_to is not None:
+            stop = decode_to
+
+        pulses = self.pending[self.searched - self.pending_index:]
+        found = list()
+        for k, tc in enumerate(self.timing_configs):
+            index, base_width = match_preamble(pulses, tc, max(len(pulses) - (stop - self.searched), nseq - 1))
+            found.extend((self.searched + i, k, w) for i, w in zip(index.tolist(), base_width))
+        found.sort(key=lambda m: m[:2])
+
+        positions = self.pending_pos + np.concatenate(([0], np.cumsum(self.pending)))
+        for i, k, w in found:
+            if i < self.decoded or (self.message is not None and self.message.start_index == i):
+                continue
+            self.decode(out, i)
+            lines = self.flush_protocol()
+            if lines:
+                out.write("\n".join(lines) + "\n")
+            out.write("Message #%d: Start at sample %d (pulse %d) with timing profile %d and base width %g.\n" %
+                    (self.nmessages, positions[i - self.pending_index], i, k, w))
+            self.message = Message(i, k, w)
+            self.nmessages += 1
+            self.decoded = i + 1
+            self.waiting = True
+        self.decode(out, stop)
+
+        self.searched = max(self.searched, min(stop, total - nseq + 1))
+        drop = max(min(self.searched, self.decoded) - self.pending_index, 0)
+        self.pending_pos = positions[drop]
+        self.pending = self.pending[drop:]
+        self.pending_index += drop
+
+    def decode(self, out, stop):
+        if stop <= self.decoded:
+            return
+        if self.message is not None and (self.active or self.waiting):
+            first = self.decoded - self.pending_index
+            codes, ended = self.decode_segment(self.decoded, self.pending[first:stop - self.pending_index],
+                    self.timing_configs[self.message.timing_cfg], self.message.base_width)
+            self.write_segment(out, codes, ended)
+        self.decoded = stop
+
+def usage():
+    print("""
+python analyzer.py [options] [waveform.txt]
+
+    -t <w1>,<w2>,...
+        add a timing profile (pulse widths in units of the base width),
+        default: 1,2,3,4,5
+
+    -a
+        infer the timing profiles of both directions from the capture
+
+    -P
+        decode packets and print the AXIS words instead of the symbols
+
+    -D <m2s>,<s2m>
+        TDATA width of each direction for -P, default: 8,8
+
+    -U <m2s>,<s2m>
+        TUSER width of each direction for -P, default: 0,0
+
+    -f int8|int16|float32
+        read a raw binary capture with the given sample format instead of a
+        text file (.npy files are detected by their extension)
+
+    -c <n>
+        number of samples and pulses processed at once, default: 4194304
+
+    -j <n>
+        find and decode the messages with <n> worker processes (0: one per
+        CPU), default: 1
+
+    -J <file>
+        write pulse width and jitter statistics as JSON to <file>
+
+    -S <ns>
+        sample period of the capture for -J, default: 1 (times in samples)
+
+    -R <recv_period>,<pulse_jitter>
+        receiver sample period and configured pulse jitter (in the units of
+        -S) of the slave for the first and of the master for the second -R,
+        -J then reports the margins of the master to slave and the slave to
+        master pulses against the receiver sample windows
+
+    -s
+        streaming mode: read the samples incrementally (use "-" for stdin)
+        with an adaptive trigger level and print messages as they are decoded
+
+    -F
+        streaming mode, wait for more data at the end of the file
+
+    -w <n>
+        window (in samples) for the adaptive trigger level, default: 4096
+
+    -H <fraction>
+        hysteresis of the adaptive trigger level relative to the signal
+        amplitude, default: 0.1
+""")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    timing_configs = list()
+    fmt = None
+    chunksize = default_chunksize
+    streaming = False
+    follow = False
+    window = 4096
+    hysteresis = 0.1
+    infer = False
+    protocol = None
+    nprocs = 1
+    jitter_file = None
+    sample_period = 1.0
+    receivers = list()
+    tdata_width = [8, 8]
+    tuser_width = [0, 0]
+
+    def pair(arg):
+        values = [int(v) for v in arg.split(",")]
+        if len(values) != 2:
+            usage()
+        return values
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "t:aPD:U:f:c:j:J:S:R:sFw:H:")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-t":
+            timing_configs.append([float(v) for v in a.split(",")])
+        elif o == "-a":
+            infer = True
+        elif o == "-P":
+            protocol = True
+        elif o == "-D":
+            tdata_width = pair(a)
+        elif o == "-U":
+            tuser_width = pair(a)
+        elif o == "-f" and a in sample_formats:
+            fmt = a
+        elif o == "-c":
+            chunksize = int(a)
+        elif o == "-j":
+            nprocs = int(a)
+        elif o == "-J":
+            jitter_file = a
+        elif o == "-S":
+            sample_period = float(a)
+        elif o == "-R":
+            values = [float(v) for v in a.split(",")]
+            if len(values) != 2:
+                usage()
+            receivers.append(values)
+        elif o == "-s":
+            streaming = True
+        elif o == "-F":
+            streaming = follow = True
+        elif o == "-w":
+            window = int(a)
+        elif o == "-H":
+            hysteresis = float(a)
+        else:
+            usage()
+
+    if len(args) > 1 or (infer and streaming) or nprocs < 0 or (nprocs != 1 and streaming) or (jitter_file and streaming):
+        usage()
+
+    filename = args[0] if len(args) else "waveform.txt"
+    if protocol:
+        protocol = ProtocolDecoder(tdata_width, tuser_width)
+
+    if streaming:
+        pa = PonyStreamAnalyzer(timing_configs if len(timing_configs) else [default_timing_config], window, hysteresis, protocol)
+        try:
+            f = sys.stdin if filename == "-" else open(filename, "rb")
+        except IOError:
+            sys.stderr.write("Can't open input file '%s'!\n" % filename)
+            sys.exit(1)
+        try:
+            for samples in read_stream(f, fmt, chunksize, follow):
+                pa.feed(samples)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        pa.finish()
+        print("Read %d samples from %s." % (pa.nsamples, filename))
+        sys.exit(0)
+
+    pa = PonyAnalyzer(timing_configs if len(timing_configs) else [default_timing_config], chunksize, protocol)
+    if fmt is not None or filename.endswith(".npy"):
+        pa.map_samples(filename, fmt)
+    else:
+        pa.read_samples(filename)
+
+    print("Read %d samples from %s." % (len(pa.samples), filename))
+    print("Sample range: %g .. %g" % (pa.min_sample, pa.max_sample))
+    print("Trigger level: %g" % pa.trigger)
+
+    pa.extract_pulses()
+    print("Extracted %d pulses." % len(pa.pulses))
+
+    if infer:
+        pa.infer_timing_configs()
+
+    pool = PulsePool(pa.pulses, nprocs if nprocs > 0 else None) if nprocs != 1 else None
+    try:
+        pa.find_messages(pool=pool)
+        pa.decode_messages(pool=pool)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if jitter_file is not None:
+        report = pa.jitter_report(sample_period, dict(enumerate(receivers)))
+        for p in report["profiles"]:
+            print("Direction #%d, timing profile #%d: %d pulses, cycle width %g, pulse jitter %g rms, %g peak%s." % (p["direction"], p["profile"],
+                    p["pulses"], p["cycle"], p["pulse_jitter_rms"], p["pulse_jitter_peak"],
+                    ", receiver margin %g" % min(c["margin"] for c in p["classes"]) if "receiver" in p else ""))
+        try:
+            with open(jitter_file, "w") as f:
+                json.dump(report, f, indent=2)
+        except IOError:
+            sys.stderr.write("Can't write output file '%s'!\n" % jitter_file)
+            sys.exit(1)
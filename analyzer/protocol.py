@@ -0,0 +1,234 @@
+#!/usr/bin/python
+#
+# protocol.py decodes the PonyLink protocol (see plinksrc/protocol.txt) from
+# the 8b10b code words that analyzer.py recovers from a capture. The code
+# words are decoded with the lookup tables from bitdist.py (including the
+# running disparity check), split into packets at K.28.7 and checked with the
+# CRC model from crcmodel.py. The payload of all good packets that are not
+# retransmissions is unscrambled and unpacked with the packer model from
+# packmodel.py, which gives the AXIS words (TDATA, TUSER, TLAST) that were
+# sent in each direction.
+#
+# Example usage:
+#
+#   python analyzer.py -P -D 8,16 -U 0,2 capture.npy
+#
+# Running "python protocol.py" checks the decoder end to end: a capture of
+# packets in both directions is synthesized with the packer model, the packet
+# framer and the 8b10b encoder from bitdist.py, and analyzer.py must recover
+# every AXIS word from it.
+#
+#   from protocol import ProtocolDecoder
+#   decoder = ProtocolDecoder(tdata_width=(8, 16), tuser_width=(0, 2))
+#   lines = decoder.decode_message(codes)
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+from collections import namedtuple
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plinksrc"))
+
+from bitdist import decode, encode, PacketFramer, sym_reset, sym_gpio, sym_end, magic_m2s, magic_s2m
+from crcmodel import packet_checksums, split_checksum
+from packmodel import Packer, Unpacker, sym_sync
+
+# Reset sequences (K.28.7 followed by four times K.29.7 or K.30.7).
+sym_reset_master = 0x1fd
+sym_reset_slave = 0x1fe
+
+direction_names = ["M2S", "S2M"]
+
+# status is one of "ok", "crc error", "code error", "truncated", "bad header"
+# and "reset". payload is an array of symbols, gpio is None if the packet has
+# no GPIO update.
+Packet = namedtuple("Packet", "direction seq_your seq_mine payload gpio status")
+
+def parse_packets(codes):
+    """
+    Splits the code words of a message into packets (each starting with
+    K.28.7) and returns a list of Packet tuples. The checksums of all packets
+    are computed as one batch.
+    """
+    symbols, errors, _ = decode(codes)
+    starts = np.flatnonzero(symbols == sym_reset)
+    stops = np.concatenate((starts[1:], [len(symbols)]))
+
+    packets, checked = list(), list()
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        p = symbols[start:stop]
+        err = errors[start:stop]
+        if len(p) >= 5 and (np.all(p[1:5] == sym_reset_master) or np.all(p[1:5] == sym_reset_slave)):
+            packets.append(Packet(0 if p[1] == sym_reset_master else 1, None, None, p[:0], None, "reset"))
+            continue
+        if len(p) < 2 or p[1] not in (magic_m2s, magic_s2m):
+            packets.append(Packet(None, None, None, p[:0], None, "bad header" if len(p) >= 2 else "truncated"))
+            continue
+        direction = 0 if p[1] == magic_m2s else 1
+
+        end = np.flatnonzero(p[4:] == sym_end)
+        if len(end) == 0 or 4 + end[0] + 5 > len(p):
+            packets.append(Packet(direction, None, None, p[:0], None, "truncated"))
+            continue
+        end = 4 + end[0]
+
+        body = p[4:end]
+        gpio = None
+        if len(body) >= 2 and body[-2] == sym_gpio:
+            gpio = int(body[-1])
+            body = body[:-2]
+        status = "code error" if np.any(err[:end+5]) or np.any(p[end+1:end+5] >= 0x100) else "ok"
+        packets.append(Packet(direction, int(p[2]), int(p[3]), body, gpio, status))
+        if status == "ok":
+            checked.append((len(packets) - 1, p[1:end], [int(v) for v in p[end+1:end+5]]))
+
+    if checked:
+        crcs = packet_checksums([c[1] for c in checked])
+        for (index, _, received), crc in zip(checked, crcs):
+            if split_checksum(crc) != received:
+                packets[index] = packets[index]._replace(status="crc error")
+    return packets
+
+def format_word(value, width):
+    """
+    Formats a TDATA or TUSER value as returned by packmodel.word_values().
+    """
+    digits = max((width + 3) // 4, 1)
+    if np.ndim(value) > 0:
+        return "0x" + "".join("%02x" % b for b in value[::-1])[-digits:]
+    return "0x%0*x" % (digits, int(value))
+
+class ProtocolDecoder:
+    """
+    Keeps the receiver state for both directions: the sequence ID expected
+    for the next payload symbol and the unpacker. Like ponylink_txrx, the
+    payload of a packet is only used if its sequence ID is the expected one
+    (otherwise it is a retransmission). The capture may start anywhere in the
+    stream, so the payload of each direction is skipped until the first
+    K.28.0 sync symbol provides the RNG seed for unscrambling.
+    """
+
+    def __init__(self, tdata_width=(8, 8), tuser_width=(0, 0)):
+        self.tdata_width = list(tdata_width)
+        self.tuser_width = list(tuser_width)
+        self.expected = [None, None]
+        self.unpackers = [None, None]
+        self.npackets = 0
+        self.nerrors = 0
+
+    def decode_message(self, codes):
+        """
+        Decodes the code words of one message and returns the output lines.
+        """
+        lines = list()
+        for pkt in parse_packets(codes):
+            self.npackets += 1
+            d = pkt.direction
+            if pkt.status == "reset":
+                lines.append("  %s reset sequence" % direction_names[d])
+                self.expected = [None, None]
+                self.unpackers = [None, None]
+                continue
+            if pkt.status != "ok":
+                self.nerrors += 1
+                lines.append("  %s packet: %s" % (direction_names[d] if d is not None else "???", pkt.status))
+                continue
+
+            repeated = self.expected[d] is not None and pkt.seq_mine != self.expected[d]
+            lines.append("  %s packet: seq_your 0x%02x, seq_mine 0x%02x, %d payload symbols%s, CRC ok%s" %
+                    (direction_names[d], pkt.seq_your, pkt.seq_mine, len(pkt.payload),
+                    ", gpio 0x%02x" % pkt.gpio if pkt.gpio is not None else "",
+                    ", retransmission" if repeated else ""))
+            if repeated:
+                continue
+            self.expected[d] = (pkt.seq_mine + len(pkt.payload)) & 0xff
+            lines.extend(self.unpack(d, pkt.payload))
+        return lines
+
+    def unpack(self, d, payload):
+        if self.unpackers[d] is None:
+            sync = np.flatnonzero(payload == sym_sync)
+            if len(sync) == 0:
+                return ["    %s waiting for sync, %d symbols skipped" % (direction_names[d], len(payload))] if len(payload) else []
+            self.unpackers[d] = Unpacker(self.tdata_width[d], self.tuser_width[d])
+            payload = payload[sync[0]:]
+
+        try:
+            tdata, tuser, tlast = self.unpackers[d].unpack(payload)
+        except ValueError as e:
+            self.unpackers[d] = None
+            return ["    %s unpack error: %s" % (direction_names[d], e)]
+
+        lines = list()
+        for i in range(len(tlast)):
+            line = "    %s TDATA %s" % (direction_names[d], format_word(tdata[i], self.tdata_width[d]))
+            if self.tuser_width[d] > 0:
+                line += " TUSER %s" % format_word(tuser[i], self.tuser_width[d])
+            lines.append(line + (" TLAST" if tlast[i] else ""))
+        return lines
+
+def synthesize_capture(nwords=500, tdata_width=(8, 16), tuser_width=(0, 2),
+        timing_configs=([1, 2, 3, 4, 5], [6, 16, 26, 36, 46]), base_width=(7, 2), seed=1):
+    """
+    Returns a tuple (samples, lines) with a noise free capture of nwords AXIS
+    words per direction, the packets of both directions taking turns, and the
+    TDATA lines that ProtocolDecoder must print for it. Between the packets
+    the line idles at the level of the first bit of the next packet, and a
+    short pulse after the last bit of each packet ends its last pulse.
+    """
+    rng = np.random.RandomState(seed)
+    packets, lines = list(), list()
+    for d in range(2):
+        tdata = rng.randint(0, 1 << tdata_width[d], nwords)
+        tuser = rng.randint(0, 1 << tuser_width[d], nwords) if tuser_width[d] else None
+        tlast = rng.rand(nwords) < 0.1
+        payload = Packer(tdata_width[d], tuser_width[d]).pack(tdata, tuser, tlast)
+        decoder = ProtocolDecoder(tdata_width, tuser_width)
+        lines.append(decoder.unpack(d, payload))
+        framer = PacketFramer(pktlen=64, lengths=[5, 20, 64], gpio_rate=0.2, magic=[magic_m2s, magic_s2m][d], seed=seed+d)
+        symbols, breaks = framer.frame(payload, flush=True)
+        packets.append(np.split(symbols, np.flatnonzero(breaks)[1:]))
+
+    chunks = list()
+    for i in range(max(len(packets[0]), len(packets[1]))):
+        for d in range(2):
+            if i >= len(packets[d]):
+                continue
+            codes, _ = encode(packets[d][i])
+            bits = ((np.asarray(codes)[:, np.newaxis] >> np.arange(9, -1, -1)) & 1).ravel()
+            bits = np.concatenate((bits, [1 - bits[-1], bits[-1]]))
+            edges = np.concatenate(([0], np.flatnonzero(np.diff(bits)) + 1))
+            runs = np.diff(np.concatenate((edges, [len(bits)])))
+            widths = np.asarray(timing_configs[d])[np.minimum(runs, 5) - 1] * base_width[d]
+            chunks.append(np.full(rng.randint(300, 1000), bits[0]))
+            chunks.append(np.repeat(bits[edges], widths))
+    return np.concatenate(chunks).astype(np.float32), lines[0] + lines[1]
+
+if __name__ == "__main__":
+    from analyzer import PonyAnalyzer
+
+    samples, expected = synthesize_capture()
+    pa = PonyAnalyzer([[1, 2, 3, 4, 5], [6, 16, 26, 36, 46]], protocol=ProtocolDecoder((8, 16), (0, 2)))
+    pa.samples = samples
+    pa.trigger = np.float32(0.5)
+    pa.extract_pulses()
+
+    out = StringIO()
+    pa.find_messages(out)
+    pa.decode_messages(out)
+    decoded = [l for l in out.getvalue().splitlines() if " TDATA " in l]
+    decoded = [l for l in decoded if " M2S " in l] + [l for l in decoded if " S2M " in l]
+
+    if decoded != expected:
+        bad = next((i for i, (a, b) in enumerate(zip(decoded, expected)) if a != b), min(len(decoded), len(expected)))
+        sys.stderr.write("Decoded %d of %d words, first mismatch at word %d!\n" % (len(decoded), len(expected), bad))
+        sys.exit(1)
+    print("Decoded all %d words in %d messages." % (len(decoded), len(pa.messages)))
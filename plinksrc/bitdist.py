@@ -1,7 +1,39 @@
 #!/usr/bin/python
+#
+# bitdist.py computes the distribution of pulse lengths (runs of identical
+# bits) in the 8b10b encoded PonyLink bit stream. The result is used as
+# TimingSolver.lendist in timings.py.
+#
+# The 8b10b code table is precomputed into NumPy arrays (code bits, resulting
+# disparity, length and value of the first and last run in each code word),
+# so that encoding and run-length counting are vectorized over blocks of
+# symbols.
+#
+# Example usage:
+#
+#   python bitdist.py
+#
+# By default the exact distribution is computed from the stationary
+# distribution of a Markov chain over (running disparity, value and length
+# of the open run). "python bitdist.py -m 1000000" runs a Monte Carlo
+# estimate instead.
+#
+# For real traffic, "python bitdist.py -f payload.bin" pushes the contents of
+# a payload file through a model of the packer (see packmodel.py) and the
+# 8b10b encoder and measures the distribution of the resulting bit stream.
+# With "-p <pktlen>" the payload is sent in packets as described in
+# protocol.txt, e.g. "python bitdist.py -p 64 -l 1,4,16,64 -g 0.1".
 
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import getopt
 import numpy as np
 
+from packmodel import Packer
+from crcmodel import crc32_batch, checksum_bytes
+
 encode_table = [
     (  0, 0, '0010111001', 0),
     (  0, 1, '1101000110', 1),
@@ -541,46 +573,522 @@ encode_table = [
     (510, 1, '1110100001', 1),
 ]
 
-encode_dict = dict()
+# Precomputed tables. Symbols are 9 bit values (0x100 = control symbol),
+# disparity 0 is RD- and disparity 1 is RD+. Codes are 10 bit values in
+# transmission order, i.e. the first bit on the wire is the MSB.
+code_bits = np.zeros((512, 2), dtype=np.int32)
+code_valid = np.zeros((512, 2), dtype=bool)
+next_disparity = np.zeros((512, 2), dtype=np.int8)
 
 for dat in encode_table:
-    if not (dat[0] in encode_dict):
-        encode_dict[dat[0]] = [ "", -1, "", -1 ]
-    if dat[1] == 0:
-        encode_dict[dat[0]][0] = dat[2]
-        encode_dict[dat[0]][1] = dat[3]
-    else:
-        encode_dict[dat[0]][2] = dat[2]
-        encode_dict[dat[0]][3] = dat[3]
-
-disparity=0
-sequence=""
-
-for i in range(1000000):
-    if i % 69 == 0:
-        idx = 0x1fc
-        disparity = 0
-        sequence += "x"
-    elif i % 69 == 67:
-        idx = 0x1bc
-    else:
-        idx = np.random.randint(256)
-    assert idx in encode_dict
-    assert encode_dict[idx][2*disparity+1] >= 0
-    sequence += encode_dict[idx][2*disparity][::-1]
-    disparity = encode_dict[idx][2*disparity+1]
-
-frequency = np.zeros(5)
-state = 'x'
-count = 1
-
-for i in range(len(sequence)):
-    if state != sequence[i]:
-        if state != 'x':
-            frequency[count-1] += count
-        state = sequence[i]
-        count = 1
-    else:
-        count += 1
+    code_bits[dat[0], dat[1]] = int(dat[2][::-1], 2)
+    code_valid[dat[0], dat[1]] = True
+    next_disparity[dat[0], dat[1]] = dat[3]
+
+# All unbalanced code words flip the running disparity, all balanced code
+# words keep it, independent of the disparity they were encoded with.
+flips_disparity = next_disparity[:, 0] != 0
+assert np.all(flips_disparity[code_valid[:, 1]] == (next_disparity[code_valid[:, 1], 1] == 0))
+
+# Run structure of all 1024 possible code words: value and length of the
+# first (head) and last (tail) run, and a histogram of the runs in between.
+# Valid code words always contain at least two runs, so head and tail are
+# never the same run.
+head_value = np.zeros(1024, dtype=np.int8)
+head_length = np.zeros(1024, dtype=np.int64)
+tail_value = np.zeros(1024, dtype=np.int8)
+tail_length = np.zeros(1024, dtype=np.int64)
+inner_runs = np.zeros((1024, 11), dtype=np.int64)
+
+for code in range(1024):
+    bits = [(code >> (9-i)) & 1 for i in range(10)]
+    runs = [[bits[0], 1]]
+    for b in bits[1:]:
+        if b == runs[-1][0]:
+            runs[-1][1] += 1
+        else:
+            runs.append([b, 1])
+    head_value[code], head_length[code] = runs[0]
+    tail_value[code], tail_length[code] = runs[-1]
+    for r in runs[1:-1]:
+        inner_runs[code, r[1]] += 1
+
+def encode(symbols, resets=None, disparity=0):
+    """
+    8b10b encode an array of 9 bit symbols. resets is an optional boolean
+    array marking symbols before which the running disparity is reset to
+    RD- (default: all K.28.7 symbols, as done by ponylink_txrx). disparity
+    is the running disparity before the first symbol.
+
+    Returns a tuple (codes, disparity) with the array of 10 bit codes and
+    the running disparity after the last symbol.
+    """
+    symbols = np.asarray(symbols, dtype=np.int64)
+    if resets is None:
+        resets = symbols == 0x1fc
+    if len(symbols) == 0:
+        return np.zeros(0, dtype=np.int32), disparity
+    if np.any((symbols < 0) | (symbols >= 512)):
+        raise ValueError("Symbol out of range.")
+
+    flips = flips_disparity[symbols].astype(np.int64)
+    flipcount = np.cumsum(flips) - flips
+    index = np.arange(len(symbols))
+    last_reset = np.maximum.accumulate(np.where(resets, index, -1))
+    disp = np.where(last_reset >= 0, flipcount - flipcount[np.maximum(last_reset, 0)], flipcount + disparity) & 1
+
+    if not np.all(code_valid[symbols, disp]):
+        raise ValueError("Can't encode symbol 0x%03x." % symbols[np.flatnonzero(~code_valid[symbols, disp])[0]])
+
+    return code_bits[symbols, disp], int(disp[-1] ^ flips[-1])
+
+# Decoder tables: decode_symbol[code] is the symbol for a 10 bit code (-1 for
+# codes the encoder never sends) and decode_disparity[code] has bit 0 set if
+# the code is sent with RD- and bit 1 if it is sent with RD+.
+decode_symbol = np.full(1024, -1, dtype=np.int64)
+decode_disparity = np.zeros(1024, dtype=np.int8)
+
+for sym, disp in zip(*np.nonzero(code_valid)):
+    assert decode_symbol[code_bits[sym, disp]] in (-1, sym)
+    decode_symbol[code_bits[sym, disp]] = sym
+    decode_disparity[code_bits[sym, disp]] |= 1 << disp
+
+# Codes with an unequal number of ones and zeros flip the running disparity.
+code_flips = np.array([bin(code).count("1") != 5 for code in range(1024)])
+
+def decode(codes, resets=None, disparity=0):
+    """
+    8b10b decode an array of 10 bit codes (first bit on the wire is the MSB).
+    resets marks codes before which the running disparity is reset to RD-
+    (default: all K.28.7 codes). disparity is the running disparity before
+    the first code.
+
+    Returns a tuple (symbols, errors, disparity) with the array of 9 bit
+    symbols (-1 for invalid codes), a boolean array marking invalid codes
+    and disparity errors, and the running disparity after the last code.
+    """
+    codes = np.asarray(codes, dtype=np.int64) & 0x3ff
+    symbols = decode_symbol[codes]
+    if resets is None:
+        resets = symbols == 0x1fc
+    if len(codes) == 0:
+        return symbols, np.zeros(0, dtype=bool), disparity
+
+    flips = code_flips[codes].astype(np.int64)
+    flipcount = np.cumsum(flips) - flips
+    index = np.arange(len(codes))
+    last_reset = np.maximum.accumulate(np.where(resets, index, -1))
+    disp = np.where(last_reset >= 0, flipcount - flipcount[np.maximum(last_reset, 0)], flipcount + disparity) & 1
+
+    errors = (symbols < 0) | ((decode_disparity[codes] >> disp) & 1 == 0)
+    return symbols, errors, int(disp[-1] ^ flips[-1])
+
+class RunLengthCounter:
+    """
+    Counts the runs of identical bits in a stream of 10 bit codes that is
+    fed in blocks via add(). counts[n] is the number of runs of length n.
+    The last run of the stream is still open and not counted.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(21, dtype=np.int64)
+        self.carry_value = -1
+        self.carry_length = 0
+
+    def add(self, codes, breaks=None):
+        """
+        Add a block of codes. breaks is an optional boolean array marking
+        codes before which the stream is interrupted, i.e. runs do not
+        continue across that boundary.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) == 0:
+            return
+        if breaks is None:
+            breaks = np.zeros(len(codes), dtype=bool)
+
+        self.counts[:11] += inner_runs[codes].sum(axis=0)
+
+        prev_value = np.concatenate([[self.carry_value], tail_value[codes[:-1]]])
+        prev_length = np.concatenate([[self.carry_length], tail_length[codes[:-1]]])
+        merge = ~breaks & (prev_value == head_value[codes])
+
+        np.add.at(self.counts, prev_length[merge] + head_length[codes[merge]], 1)
+        np.add.at(self.counts, prev_length[~merge & (prev_length > 0)], 1)
+        np.add.at(self.counts, head_length[codes[~merge]], 1)
+
+        self.carry_value = int(tail_value[codes[-1]])
+        self.carry_length = int(tail_length[codes[-1]])
+
+    def lendist(self):
+        """
+        Returns the fraction of bits in runs of length 1 .. 5.
+        """
+        weighted = self.counts * np.arange(len(self.counts))
+        return weighted[1:6] / np.sum(weighted)
+
+def random_symbols(nsymbols, offset=0):
+    """
+    Returns nsymbols random symbols with simplified framing: a K.28.7 every
+    69 symbols, a K.28.5 two symbols before it, uniformly random data bytes
+    everywhere else. offset is the index of the first symbol.
+    """
+    index = np.arange(offset, offset + nsymbols)
+    symbols = np.random.randint(256, size=nsymbols)
+    symbols[index % 69 == 0] = 0x1fc
+    symbols[index % 69 == 67] = 0x1bc
+    return symbols
+
+def bit_distribution(nsymbols=1000000, blocksize=65536):
+    """
+    Monte Carlo estimate of the pulse length distribution for
+    random_symbols(). Returns the fraction of bits in runs of length 1 .. 5.
+    """
+    counter = RunLengthCounter()
+    disparity = 0
+    for offset in range(0, nsymbols, blocksize):
+        symbols = random_symbols(min(blocksize, nsymbols - offset), offset)
+        codes, disparity = encode(symbols, disparity=disparity)
+        counter.add(codes, symbols == 0x1fc)
+    return counter.lendist()
+
+# States of the Markov chain used by exact_lendist(): running disparity,
+# value and length of the last (still open) run.
+markov_states = [(d, v, n) for d in range(2) for v in range(2) for n in range(1, 6)]
+
+def markov_tables(resets=None):
+    """
+    Returns a tuple (next_state, runs) describing the transitions of the
+    Markov chain over markov_states for all 512 symbols. next_state[i, s]
+    is the state after sending symbol s in state i (-1 if s can't be
+    encoded), runs[i, s, n] is the number of runs of length n completed by
+    it. resets is an optional boolean array of length 512 marking the
+    symbols that reset the running disparity (default: K.28.7).
+    """
+    if resets is None:
+        resets = np.arange(512) == 0x1fc
+    index = dict((state, i) for i, state in enumerate(markov_states))
+    next_state = -np.ones((len(markov_states), 512), dtype=np.int64)
+    runs = np.zeros((len(markov_states), 512, 21), dtype=np.int64)
+
+    for i, (d, v, n) in enumerate(markov_states):
+        for sym in range(512):
+            disp = 0 if resets[sym] else d
+            if not code_valid[sym, disp]:
+                continue
+            code = code_bits[sym, disp]
+            runs[i, sym, :11] += inner_runs[code]
+            if not resets[sym] and v == head_value[code]:
+                runs[i, sym, n + head_length[code]] += 1
+            else:
+                runs[i, sym, n] += 1
+                runs[i, sym, head_length[code]] += 1
+            next_state[i, sym] = index[(disp ^ int(flips_disparity[sym]), int(tail_value[code]), int(tail_length[code]))]
+
+    return next_state, runs
+
+def symbol_probabilities(byte_probs=None, control_probs=None):
+    """
+    Returns an array of 512 symbol probabilities. byte_probs are the
+    (relative) probabilities of the 256 data bytes (default: uniform),
+    control_probs is a dict mapping control symbols (0x100 | K.x.y) to
+    their absolute probabilities. The data bytes share the remaining
+    probability.
+    """
+    probs = np.zeros(512)
+    probs[:256] = 1 if byte_probs is None else np.asarray(byte_probs, dtype=np.float64)
+    probs[:256] /= np.sum(probs[:256])
+    if control_probs:
+        probs[:256] *= 1 - sum(control_probs.values())
+        for sym, p in control_probs.items():
+            probs[sym] = p
+    return probs
+
+def framing_probabilities(byte_probs=None, period=69):
+    """
+    Returns the per-position symbol probabilities (shape (period, 512)) of
+    the simplified framing used by random_symbols().
+    """
+    probs = np.tile(symbol_probabilities(byte_probs), (period, 1))
+    probs[0] = 0
+    probs[0, 0x1fc] = 1
+    probs[period-2] = 0
+    probs[period-2, 0x1bc] = 1
+    return probs
+
+def exact_lendist(probs, resets=None):
+    """
+    Computes the exact fraction of bits in runs of length 1 .. 5 from the
+    stationary distribution of the Markov chain over markov_states.
 
-print(frequency / np.sum(frequency))
+    probs is either an array of 512 symbol probabilities (independent
+    symbols) or an array of shape (period, 512) with the probabilities for
+    each position of a periodic frame. resets is passed to markov_tables().
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if probs.ndim == 1:
+        probs = probs[np.newaxis, :]
+    next_state, runs = markov_tables(resets)
+    nstates = len(markov_states)
+
+    if np.any((probs > 0) & np.any(next_state < 0, axis=0)):
+        raise ValueError("Symbol with non-zero probability can't be encoded.")
+    next_state = np.maximum(next_state, 0)
+
+    transitions = []
+    for p in probs:
+        P = np.zeros((nstates, nstates))
+        for i in range(nstates):
+            np.add.at(P[i], next_state[i], p)
+        transitions.append(P)
+
+    # stationary distribution at the start of the frame
+    P = np.eye(nstates)
+    for T in transitions:
+        P = P.dot(T)
+    A = np.vstack([P.T - np.eye(nstates), np.ones((1, nstates))])
+    b = np.zeros(nstates + 1)
+    b[-1] = 1
+    pi = np.linalg.lstsq(A, b, rcond=None)[0]
+
+    counts = np.zeros(runs.shape[2])
+    for p, T in zip(probs, transitions):
+        counts += pi.dot(np.tensordot(p, runs, axes=([0], [1])))
+        pi = pi.dot(T)
+
+    weighted = counts * np.arange(len(counts))
+    return weighted[1:6] / np.sum(weighted)
+
+# Packet framing (see "TX/RX Engine" in protocol.txt and ponylink_txrx.v).
+# The tail symbol (0x100) is not part of the modelled bit stream: its first
+# bit is the transition that ends the last checksum pulse, afterwards the
+# line is turned around. It is balanced like D.0.0, so it does not change the
+# running disparity either.
+sym_preamble = 0xb5
+sym_reset = 0x1fc       # K.28.7
+sym_gpio = 0x19c        # K.28.4
+sym_end = 0x1bc         # K.28.5
+magic_m2s = 0x9e
+magic_s2m = 0x74
+
+class PacketFramer:
+    """
+    Splits a stream of payload symbols (packer output) into packets. The
+    payload length of each packet is drawn from lengths (default: always
+    pktlen). A GPIO update is added with probability gpio_rate. The sequence
+    ID of this side counts the payload symbols, the sequence ID of the peer
+    and the GPIO values are random bytes. The checksum is computed with
+    crcmodel.py.
+
+    frame() keeps payload symbols that don't fill a whole packet for the
+    next call, so the payload can be fed in chunks.
+    """
+
+    def __init__(self, pktlen=64, lengths=None, gpio_rate=0.0, magic=magic_m2s, seed=None):
+        self.lengths = np.array([pktlen] if lengths is None else lengths, dtype=np.int64)
+        if np.any((self.lengths < 0) | (self.lengths > pktlen)):
+            raise ValueError("Payload lengths must be in the range 0 .. %d." % pktlen)
+        self.gpio_rate = gpio_rate
+        self.magic = magic
+        self.random = np.random.RandomState(seed)
+        self.seq = 0
+        self.pending = np.zeros(0, dtype=np.int64)
+
+    def frame(self, payload, flush=False):
+        """
+        Adds payload symbols and returns a tuple (symbols, breaks) for all
+        complete packets. breaks marks the first symbol of each packet. With
+        flush set, the remaining payload is sent in a final shorter packet.
+        """
+        payload = np.concatenate([self.pending, np.asarray(payload, dtype=np.int64)])
+
+        # draw more packet lengths than needed and keep those that fit
+        mean = max(np.mean(self.lengths), 1)
+        lengths = self.random.choice(self.lengths, size=int(len(payload) / mean * 1.1) + 16)
+        while np.sum(lengths) < len(payload):
+            lengths = np.concatenate([lengths, self.random.choice(self.lengths, size=len(lengths))])
+        count = int(np.searchsorted(np.cumsum(lengths), len(payload), side="right"))
+        lengths = lengths[:count]
+        used = int(np.sum(lengths))
+        if flush and used < len(payload):
+            lengths = np.concatenate([lengths, [len(payload) - used]])
+            used = len(payload)
+        self.pending = payload[used:]
+
+        n = len(lengths)
+        gpio = self.random.random_sample(n) < self.gpio_rate
+        size = 5 + lengths + 2 * gpio + 5
+        end = np.cumsum(size)
+        start = end - size
+        symbols = np.zeros(end[-1] if n else 0, dtype=np.int64)
+        breaks = np.zeros(len(symbols), dtype=bool)
+        breaks[start] = True
+
+        seq = (self.seq + np.cumsum(lengths) - lengths) & 0xff
+        self.seq = (self.seq + used) & 0xff
+        header = [np.full(n, sym_preamble), np.full(n, sym_reset), np.full(n, self.magic),
+                self.random.randint(256, size=n), seq]
+        for i, value in enumerate(header):
+            symbols[start + i] = value
+
+        in_payload = np.repeat(start + 5 - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        symbols[in_payload + np.arange(used)] = payload[:used]
+
+        pos = start + 5 + lengths
+        symbols[pos[gpio]] = sym_gpio
+        symbols[pos[gpio] + 1] = self.random.randint(256, size=np.sum(gpio))
+        pos += 2 * gpio
+        symbols[pos] = sym_end
+
+        # checksum over everything between K.28.7 and K.28.5
+        crc_len = pos - start - 2
+        index = np.minimum(start[:, np.newaxis] + 2 + np.arange(max(crc_len.max(), 1) if n else 1), len(symbols) - 1)
+        crc = crc32_batch(checksum_bytes(symbols[index]), crc_len)
+        for i in range(4):
+            symbols[pos + 1 + i] = (crc >> np.uint32(8*i)) & 0xff
+
+        return symbols, breaks
+
+def packet_lendist(npackets=100000, pktlen=64, lengths=None, gpio_rate=0.0, seed=None):
+    """
+    Monte Carlo estimate of the pulse length distribution for npackets
+    packets with random payload data (packed with packmodel.Packer).
+    Returns the fraction of bits in runs of length 1 .. 5.
+    """
+    framer = PacketFramer(pktlen, lengths, gpio_rate, seed=seed)
+    packer = Packer()
+    counter = RunLengthCounter()
+    disparity = 0
+    nwords = int(npackets * max(np.mean(framer.lengths), 1))
+    for offset in range(0, nwords, 65536):
+        words = framer.random.randint(256, size=min(65536, nwords - offset))
+        symbols, breaks = framer.frame(packer.pack(words), offset + 65536 >= nwords)
+        codes, disparity = encode(symbols, disparity=disparity)
+        counter.add(codes, breaks)
+    return counter.lendist()
+
+# Record format for payload files with TUSER and TLAST: one TDATA byte, one
+# TUSER byte and one flags byte (bit 0 = TLAST) per AXIS word.
+record_dtype = np.dtype([("tdata", np.uint8), ("tuser", np.uint8), ("flags", np.uint8)])
+
+def payload_lendist(filename, records=False, tuser_width=0, chunksize=65536, framer=None):
+    """
+    Measures the pulse length distribution for the AXIS words in a payload
+    file. The file is read in chunks of chunksize words, which are packed
+    with packmodel.Packer and 8b10b encoded, so memory use does not depend
+    on the file size. With records = False every byte of the file is one
+    TDATA word, otherwise the file contains record_dtype records. If a
+    PacketFramer is given, the packed symbols are sent in packets.
+
+    Returns the fraction of bits in runs of length 1 .. 5.
+    """
+    packer = Packer(tuser_width=tuser_width)
+    counter = RunLengthCounter()
+    disparity = 0
+    wordsize = record_dtype.itemsize if records else 1
+    with open(filename, "rb") as f:
+        data = f.read(chunksize * wordsize)
+        while len(data) > 0:
+            next_data = f.read(chunksize * wordsize)
+            if records:
+                words = np.frombuffer(data[:len(data) - len(data) % wordsize], dtype=record_dtype)
+                symbols = packer.pack(words["tdata"], words["tuser"], words["flags"] & 1)
+            else:
+                symbols = packer.pack(np.frombuffer(data, dtype=np.uint8))
+            breaks = None
+            if framer is not None:
+                symbols, breaks = framer.frame(symbols, len(next_data) == 0)
+            codes, disparity = encode(symbols, disparity=disparity)
+            counter.add(codes, breaks)
+            data = next_data
+    return counter.lendist()
+
+def usage():
+    print("""
+python bitdist.py [-m <nsymbols>] [-f <payload-file> [-r] [-u <width>]] \\
+        [-p <pktlen> [-l <len>[,<len>...]] [-g <rate>] [-n <npackets>]]
+
+    Prints the fractions of bits sent in pulses of 1 .. 5 bit times for
+    random data bytes with a K.28.7 every 69 symbols (see TimingSolver.lendist
+    in timings.py). By default the exact distribution is computed from the
+    stationary distribution of a Markov chain.
+
+    -m <nsymbols>
+        Monte Carlo estimate from nsymbols random symbols instead
+
+    -f <payload-file>
+        measure the distribution for the AXIS traffic in the given file,
+        packed and scrambled like ponylink_pack_8bits does it. By default
+        every byte of the file is one TDATA word.
+
+    -r
+        the payload file contains 3 byte records (TDATA, TUSER, flags
+        with bit 0 = TLAST) instead of raw TDATA bytes
+
+    -u <width>
+        TUSER_WIDTH for -r, default: 8 (0 = ignore TUSER)
+
+    -p <pktlen>
+        send the payload in real packets (preamble, sequence IDs, GPIO
+        update, end symbol and checksum) with SEND_PKTLEN = pktlen. Without
+        -f random payload data is used.
+
+    -l <len>[,<len>...]
+        payload lengths for -p, each packet uses a random one of the given
+        lengths (repeat values for weighting), default: pktlen
+
+    -g <rate>
+        probability of a GPIO update per packet for -p, default: 0
+
+    -n <npackets>
+        number of packets with random payload for -p, default: 100000
+""")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    nsymbols = None
+    payload_file = None
+    records = False
+    tuser_width = 8
+    pktlen = None
+    lengths = None
+    gpio_rate = 0.0
+    npackets = 100000
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "m:f:ru:p:l:g:n:")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-m":
+            nsymbols = int(a)
+        elif o == "-f":
+            payload_file = a
+        elif o == "-r":
+            records = True
+        elif o == "-u":
+            tuser_width = int(a)
+        elif o == "-p":
+            pktlen = int(a)
+        elif o == "-l":
+            lengths = [int(v) for v in a.split(",")]
+        elif o == "-g":
+            gpio_rate = float(a)
+        elif o == "-n":
+            npackets = int(a)
+        else:
+            usage()
+
+    if len(args) != 0:
+        usage()
+
+    if payload_file is not None:
+        framer = None if pktlen is None else PacketFramer(pktlen, lengths, gpio_rate)
+        print(payload_lendist(payload_file, records, tuser_width if records else 0, framer=framer))
+    elif pktlen is not None:
+        print(packet_lendist(npackets, pktlen, lengths, gpio_rate))
+    elif nsymbols is None:
+        print(exact_lendist(framing_probabilities()))
+    else:
+        print(bit_distribution(nsymbols))
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+#
+# crcmodel.py computes the PonyLink packet checksum (ponylink_crc32.v and the
+# checksum generator in ponylink_txrx.v) in software.
+#
+# The CRC is a CRC-32 with polynomial 0x04C11DB7, initial value 0xffffffff,
+# MSB-first shift register, no reflection and no final XOR (CRC-32/MPEG-2).
+# ponylink_txrx resets it with the K.28.7 symbol and feeds all following
+# symbols up to (but excluding) K.28.5 into it, control symbols as the
+# inverted low 8 bits. The 32 bit result is sent LSB first.
+#
+# The implementation uses slicing-by-8 tables and processes whole batches of
+# packets in parallel with NumPy. Long buffers are split into chunks that are
+# computed in parallel and combined afterwards.
+#
+# Example usage:
+#
+#   from crcmodel import crc32, packet_checksum
+#   crc = crc32(b"123456789")       # 0x0376e6e7
+#   crc = packet_checksum([0x9e, 0x00, 0x00, 0x12, 0x34])
+
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+crc_poly = 0x04c11db7
+crc_init = 0xffffffff
+
+def _make_tables():
+    tables = np.zeros((8, 256), dtype=np.uint32)
+    for i in range(256):
+        crc = i << 24
+        for k in range(8):
+            crc = ((crc << 1) ^ crc_poly if crc & 0x80000000 else crc << 1) & 0xffffffff
+        tables[0, i] = crc
+    for k in range(1, 8):
+        tables[k] = (tables[k-1] << np.uint32(8)) ^ tables[0][tables[k-1] >> np.uint32(24)]
+    return tables
+
+# crc_tables[k][b] is the CRC register after shifting byte b in, followed by
+# k zero bytes (starting from an all-zero register).
+crc_tables = _make_tables()
+
+# The same tables for 16 bit indices: crc_tables16[k][w] combines the
+# entries of crc_tables[2*k+1] and crc_tables[2*k] for the bytes of w.
+_w = np.arange(65536)
+crc_tables16 = np.array([crc_tables[2*k+1][_w >> 8] ^ crc_tables[2*k][_w & 0xff] for k in range(4)], dtype=np.uint32)
+del _w
+
+def crc32_batch(data, lengths=None, crc=crc_init):
+    """
+    Computes the CRCs for a batch of byte strings. data is an (n, maxlen)
+    uint8 array with one byte string per row, lengths the number of valid
+    bytes in each row (default: all). crc is the initial register value (a
+    scalar or one value per row). Returns an uint32 array of n CRCs.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    n, maxlen = data.shape
+    lengths = np.full(n, maxlen) if lengths is None else np.asarray(lengths)
+    crc = np.zeros(n, dtype=np.uint32) ^ np.uint32(crc) if np.isscalar(crc) else np.asarray(crc, dtype=np.uint32).copy()
+    T = crc_tables
+    sh24, sh16, sh8 = np.uint32(24), np.uint32(16), np.uint32(8)
+
+    if np.all(lengths == maxlen) and maxlen % 8 == 0:
+        # fast path: 8 bytes per step as two big-endian 32 bit words
+        T16 = crc_tables16
+        words = np.ascontiguousarray(np.ascontiguousarray(data).view(">u2").T).astype(np.uint16)
+        for k in range(0, len(words), 4):
+            c = crc ^ ((words[k].astype(np.uint32) << sh16) | words[k+1])
+            crc = T16[3][c >> sh16] ^ T16[2][c & 0xffff] ^ T16[1][words[k+2]] ^ T16[0][words[k+3]]
+        return crc
+
+    for offset in range(0, maxlen, 8):
+        full = np.flatnonzero(lengths >= offset + 8)
+        if len(full) == len(crc):
+            block = data[:, offset:offset+8]
+            c = crc
+        else:
+            block = data[full, offset:offset+8]
+            c = crc[full]
+        if len(block) > 0 and block.shape[1] == 8:
+            c = c ^ ((block[:, 0].astype(np.uint32) << sh24) | (block[:, 1].astype(np.uint32) << sh16) |
+                    (block[:, 2].astype(np.uint32) << sh8) | block[:, 3])
+            c = (T[7][c >> sh24] ^ T[6][(c >> sh16) & 0xff] ^ T[5][(c >> sh8) & 0xff] ^ T[4][c & 0xff] ^
+                    T[3][block[:, 4]] ^ T[2][block[:, 5]] ^ T[1][block[:, 6]] ^ T[0][block[:, 7]])
+            crc[full] = c
+
+        # remaining bytes of rows that end within this block
+        for k in range(8):
+            rows = np.flatnonzero((lengths < offset + 8) & (lengths > offset + k))
+            if len(rows) == 0:
+                break
+            c = crc[rows]
+            crc[rows] = (c << sh8) ^ T[0][(c >> sh24) ^ data[rows, offset+k]]
+
+    return crc
+
+def _shift_tables(nbytes):
+    """
+    Returns 4 tables of 256 entries that map the bytes of a CRC register to
+    its contribution after shifting in nbytes zero bytes.
+    """
+    unit = np.zeros((32, max(nbytes, 1)), dtype=np.uint8)
+    columns = crc32_batch(unit[:, :nbytes], crc=np.uint32(1) << np.arange(32, dtype=np.uint32))
+    tables = np.zeros((4, 256), dtype=np.uint32)
+    for i in range(8):
+        for k in range(4):
+            tables[k][(np.arange(256) >> i) & 1 == 1] ^= columns[8*k + i]
+    return tables
+
+def crc32(data, crc=crc_init, chunksize=4096):
+    """
+    Returns the CRC of a byte string (bytes or uint8 array), starting with
+    the register value crc. Long buffers are split in chunks of chunksize
+    bytes that are computed as one batch and combined afterwards.
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else np.asarray(data, dtype=np.uint8)
+    nchunks = len(data) // chunksize
+    if nchunks < 2:
+        return int(crc32_batch(data[np.newaxis, :], crc=crc)[0])
+
+    partial = crc32_batch(data[:nchunks*chunksize].reshape(nchunks, chunksize), crc=0)
+    shift = _shift_tables(chunksize)
+    crc = int(crc)
+    for p in partial:
+        crc = int(shift[0][crc & 0xff] ^ shift[1][(crc >> 8) & 0xff] ^ shift[2][(crc >> 16) & 0xff] ^
+                shift[3][crc >> 24] ^ p)
+    rest = data[nchunks*chunksize:]
+    return int(crc32_batch(rest[np.newaxis, :], crc=crc)[0]) if len(rest) else crc
+
+def checksum_bytes(symbols):
+    """
+    Maps 9 bit symbols to the bytes fed into the CRC by ponylink_txrx:
+    control symbols enter as the inverted low 8 bits.
+    """
+    symbols = np.asarray(symbols, dtype=np.int64)
+    return np.where(symbols >= 0x100, ~symbols, symbols).astype(np.uint8)
+
+def packet_checksums(packets):
+    """
+    Returns the checksums for a list of packets. Each packet is the list of
+    symbols between K.28.7 and K.28.5 (direction byte, sequence IDs,
+    payload and the optional GPIO update).
+    """
+    lengths = np.array([len(p) for p in packets], dtype=np.int64)
+    data = np.zeros((len(packets), max(lengths.max(), 1) if len(packets) else 1), dtype=np.uint8)
+    for i, p in enumerate(packets):
+        data[i, :len(p)] = checksum_bytes(p)
+    return crc32_batch(data, lengths)
+
+def packet_checksum(symbols):
+    """
+    Returns the checksum for a single packet, see packet_checksums().
+    """
+    return int(packet_checksums([symbols])[0])
+
+def split_checksum(crc):
+    """
+    Returns the 4 checksum bytes in the order they are sent.
+    """
+    return [(int(crc) >> (8*i)) & 0xff for i in range(4)]
+
+def check_packet(symbols):
+    """
+    Checks the checksum of a received packet. symbols is the complete packet
+    from K.28.7 up to and including the 4 checksum bytes. Returns False if
+    the packet is malformed or the checksum does not match.
+    """
+    symbols = list(symbols)
+    if len(symbols) < 6 or symbols[0] != 0x1fc or 0x1bc not in symbols:
+        return False
+    end = symbols.index(0x1bc)
+    if len(symbols) != end + 5:
+        return False
+    return split_checksum(packet_checksum(symbols[1:end])) == symbols[end+1:]
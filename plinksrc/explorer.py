@@ -0,0 +1,200 @@
+#!/usr/bin/python
+#
+# explorer.py searches the design space of clock frequencies and serdes widths
+# for a PonyLink master/slave pair and prints the Pareto-optimal configurations
+# with respect to master->slave bandwidth, slave->master bandwidth and the
+# largest timing value (which must fit in the 8 bit fields of the TIMINGS
+# parameters). For each configuration the largest pulse jitter that still
+# decodes cleanly is printed as well, so configurations can be ranked by
+# robustness.
+#
+# Example usage:
+#
+#   python explorer.py -m 100,125,150,200,250 -s 50:200:10 -j 0.5 -J 0.5
+#
+# Clock frequencies are given in MHz (either as comma separated list or as
+# start:stop:step range), jitter values in nanoseconds.
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import getopt
+import itertools
+import multiprocessing
+import numpy as np
+
+from timings import TimingSolver, pack_timings, period_range
+
+def usage():
+    print("""
+python explorer.py [options]
+
+    -m <MHz>[,<MHz>...] | <start>:<stop>:<step>
+        available master clock frequencies (required)
+
+    -s <MHz>[,<MHz>...] | <start>:<stop>:<step>
+        available slave clock frequencies (required)
+
+    -M <n>[,<n>...]
+        master serdes widths (MASTER_PARBITS), default: 1,2,4
+
+    -S <n>[,<n>...]
+        slave serdes widths (SLAVE_PARBITS), default: 1,2,4
+
+    -j <ns>
+        master to slave pulse jitter, default: 0.5
+
+    -J <ns>
+        slave to master pulse jitter, default: 0.5
+
+    -t <ppm>
+        clock frequency tolerance (on both sides), default: 0
+
+    -c <fraction>
+        down-spread spread-spectrum modulation (e.g. 0.005), default: 0
+
+    -p <n>
+        number of worker processes, default: number of CPUs
+
+    -a
+        print all valid configurations, not only the Pareto front
+""")
+    sys.exit(1)
+
+def parse_values(arg):
+    if ":" in arg:
+        start, stop, step = [float(v) for v in arg.split(":")]
+        return list(np.arange(start, stop + step/2, step))
+    return [float(v) for v in arg.split(",")]
+
+def solve_chunk(chunk):
+    """
+    Solve a list of (master_mhz, master_parbits, slave_mhz, slave_parbits,
+    m2s_jitter, s2m_jitter, ppm, ssc) tuples. Returns the transmit and sample
+    timings, bandwidths and maximum tolerable jitter (at the nominal clock
+    periods) for both directions as arrays.
+    """
+    chunk = np.array(chunk, dtype=np.float64).reshape(-1, 8)
+    master_period = 1000 / chunk[:, 0] / chunk[:, 1]
+    slave_period = 1000 / chunk[:, 2] / chunk[:, 3]
+    master_min, master_max = period_range(master_period, chunk[:, 6], chunk[:, 7])
+    slave_min, slave_max = period_range(slave_period, chunk[:, 6], chunk[:, 7])
+    solver = TimingSolver()
+    m2s_tt, m2s_st, m2s_bw = solver.solve_interval_grid(master_min, master_max, slave_min, slave_max, chunk[:, 4])
+    s2m_tt, s2m_st, s2m_bw = solver.solve_interval_grid(slave_min, slave_max, master_min, master_max, chunk[:, 5])
+    m2s_mj = solver.jitter_margin_grid(master_period, slave_period, m2s_tt)[0]
+    s2m_mj = solver.jitter_margin_grid(slave_period, master_period, s2m_tt)[0]
+    return m2s_tt, m2s_st, m2s_bw, s2m_tt, s2m_st, s2m_bw, m2s_mj, s2m_mj
+
+def pareto_front(objectives):
+    """
+    Returns a boolean mask of the rows in objectives that are not dominated
+    by any other row. All objectives are maximized.
+    """
+    mask = np.ones(len(objectives), dtype=bool)
+    for i in range(len(objectives)):
+        dominated = np.all(objectives >= objectives[i], axis=1) & np.any(objectives > objectives[i], axis=1)
+        mask[i] = not dominated.any()
+    return mask
+
+def explore(master_freqs, slave_freqs, master_parbits, slave_parbits, m2s_jitter, s2m_jitter, processes=None, show_all=False, ppm=0, ssc=0):
+    """
+    Solve all combinations of the given clock frequencies and serdes widths
+    in a process pool. Returns a list of result rows (dicts), sorted by
+    descending total bandwidth. With ppm or ssc set, the timings are solved
+    for the whole clock period range (see TimingSolver.solve_interval_grid())
+    and the bandwidths are the guaranteed bandwidths at the slowest clocks.
+    """
+    combinations = list(itertools.product(master_freqs, master_parbits, slave_freqs, slave_parbits, [m2s_jitter], [s2m_jitter], [ppm], [ssc]))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    nchunks = max(1, min(len(combinations) // 256, 4 * processes))
+    chunks = [combinations[i::nchunks] for i in range(nchunks)]
+    chunk_order = [i for k in range(nchunks) for i in range(k, len(combinations), nchunks)]
+
+    if processes > 1 and nchunks > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(solve_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [solve_chunk(c) for c in chunks]
+
+    m2s_tt, m2s_st, m2s_bw, s2m_tt, s2m_st, s2m_bw, m2s_mj, s2m_mj = [np.concatenate([r[k] for r in results]) for k in range(8)]
+    combinations = [combinations[i] for i in chunk_order]
+
+    max_timing = np.max(np.hstack([m2s_tt, m2s_st, s2m_tt, s2m_st]), axis=1)
+    valid = max_timing <= 255
+    if not show_all:
+        objectives = np.column_stack([m2s_bw, s2m_bw, -max_timing])
+        valid[valid] = pareto_front(objectives[valid])
+
+    rows = []
+    for i in np.flatnonzero(valid):
+        rows.append(dict(master_mhz=combinations[i][0], master_parbits=int(combinations[i][1]),
+                slave_mhz=combinations[i][2], slave_parbits=int(combinations[i][3]),
+                m2s_bw=m2s_bw[i], s2m_bw=s2m_bw[i], max_timing=int(max_timing[i]),
+                m2s_max_jitter=m2s_mj[i], s2m_max_jitter=s2m_mj[i],
+                master_timings=pack_timings([int(v) for v in m2s_tt[i]], [int(v) for v in s2m_st[i]]),
+                slave_timings=pack_timings([int(v) for v in s2m_tt[i]], [int(v) for v in m2s_st[i]])))
+    rows.sort(key=lambda r: -(r["m2s_bw"] + r["s2m_bw"]))
+    return rows
+
+if __name__ == "__main__":
+    master_freqs = None
+    slave_freqs = None
+    master_parbits = [1, 2, 4]
+    slave_parbits = [1, 2, 4]
+    m2s_jitter = 0.5
+    s2m_jitter = 0.5
+    processes = None
+    show_all = False
+    ppm = 0
+    ssc = 0
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "m:s:M:S:j:J:t:c:p:a")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-m":
+            master_freqs = parse_values(a)
+        elif o == "-s":
+            slave_freqs = parse_values(a)
+        elif o == "-M":
+            master_parbits = [int(v) for v in a.split(",")]
+        elif o == "-S":
+            slave_parbits = [int(v) for v in a.split(",")]
+        elif o == "-j":
+            m2s_jitter = float(a)
+        elif o == "-J":
+            s2m_jitter = float(a)
+        elif o == "-t":
+            ppm = float(a)
+        elif o == "-c":
+            ssc = float(a)
+        elif o == "-p":
+            processes = int(a)
+        elif o == "-a":
+            show_all = True
+        else:
+            usage()
+
+    if len(args) > 0 or master_freqs is None or slave_freqs is None:
+        usage()
+
+    rows = explore(master_freqs, slave_freqs, master_parbits, slave_parbits, m2s_jitter, s2m_jitter, processes, show_all, ppm, ssc)
+
+    print()
+    print("** %s (%d configurations) **" % ("VALID CONFIGURATIONS" if show_all else "PARETO FRONT", len(rows)))
+    print()
+    print("  master MHz  PARBITS   slave MHz  PARBITS     M2S MBit/s   S2M MBit/s   max   M2S max jitter  S2M max jitter   MASTER_TIMINGS          SLAVE_TIMINGS")
+    for r in rows:
+        print("  %10.3f  %7d  %10.3f  %7d     %10.2f   %10.2f   %3d   %11.3f ns  %11.3f ns   80'h%020x  80'h%020x" % (r["master_mhz"], r["master_parbits"],
+                r["slave_mhz"], r["slave_parbits"], r["m2s_bw"], r["s2m_bw"], r["max_timing"], r["m2s_max_jitter"], r["s2m_max_jitter"],
+                r["master_timings"], r["slave_timings"]))
+    print()
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+#
+# goodput.py predicts the net AXIS throughput (goodput) of a PonyLink link in
+# both directions. It combines a solved timing configuration (see timings.py)
+# with the packet framing described in protocol.txt, the half-duplex
+# turnaround delays (RECV_DELAY/SEND_DELAY) and the packer overhead for a
+# given traffic mix.
+#
+# Example usage:
+#
+#   python goodput.py -M 4 -S 2 4 10 0.5 0.5
+#
+# Run "python goodput.py" without arguments for a list of options.
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import getopt
+from collections import namedtuple
+
+from timings import TimingSolver
+
+# Symbols per packet besides the payload: preamble (0xb5, K.28.7, direction
+# byte), two sequence IDs, K.28.5, 4 checksum bytes and the tail symbol.
+packet_overhead = 11
+
+# Symbols per GPIO update (K.28.4 + data byte).
+gpio_overhead = 2
+
+# The packer sends a sync symbol (K.28.0) and a 4 byte RNG seed after every
+# 4096 scrambled symbols.
+sync_interval = 4096
+sync_overhead = 5
+
+class TrafficMix(namedtuple("TrafficMix", ["tdata_width", "tuser_width", "tuser_toggle_rate", "tlast_rate", "active"])):
+    """
+    Traffic mix for one direction of the link. tuser_toggle_rate and
+    tlast_rate are the probabilities that a word has a new TUSER value or
+    the TLAST bit set. If active is false, no AXIS data is sent in this
+    direction at all.
+    """
+    __slots__ = ()
+
+    def __new__(cls, tdata_width=8, tuser_width=0, tuser_toggle_rate=0.0, tlast_rate=0.0, active=True):
+        return super(TrafficMix, cls).__new__(cls, tdata_width, tuser_width, tuser_toggle_rate, tlast_rate, active)
+
+    def symbols_per_word(self):
+        """
+        Average number of 9 bit symbols the packer creates for one AXIS word.
+        """
+        tdata_bytes = (self.tdata_width + 7) // 8
+        tuser_bytes = (self.tuser_width + 7) // 8
+        scrambled = tdata_bytes + self.tuser_toggle_rate * tuser_bytes
+        symbols = scrambled + self.tlast_rate
+        if tuser_bytes:
+            symbols += self.tuser_toggle_rate
+        return symbols + scrambled * sync_overhead / sync_interval
+
+class LinkParams(namedtuple("LinkParams", ["master_clk_period", "slave_clk_period", "master_parbits", "slave_parbits",
+        "master_recv_delay", "slave_recv_delay", "master_send_delay", "slave_send_delay",
+        "master_pktlen", "slave_pktlen", "gpio_rate", "idle_wait"])):
+    """
+    Core parameters of a link. The clock periods are in ns, the delays in
+    clock cycles of the respective core. gpio_rate is the probability that
+    a packet contains a GPIO update. If idle_wait is true the random wait of
+    up to 64 bit times described in protocol.txt is added when both packets
+    of a transfer are shorter than 64 payload symbols. The defaults match
+    the ponylink_master parameter defaults.
+    """
+    __slots__ = ()
+
+    def __new__(cls, master_clk_period, slave_clk_period, master_parbits=1, slave_parbits=1,
+            master_recv_delay=4, slave_recv_delay=4, master_send_delay=32, slave_send_delay=32,
+            master_pktlen=64, slave_pktlen=64, gpio_rate=0.0, idle_wait=True):
+        return super(LinkParams, cls).__new__(cls, master_clk_period, slave_clk_period, master_parbits, slave_parbits,
+                master_recv_delay, slave_recv_delay, master_send_delay, slave_send_delay,
+                master_pktlen, slave_pktlen, gpio_rate, idle_wait)
+
+GoodputResult = namedtuple("GoodputResult", ["m2s_goodput", "s2m_goodput", "cycle_time",
+        "m2s_packet_time", "s2m_packet_time", "turnaround_time", "idle_time",
+        "m2s_words", "s2m_words"])
+
+class GoodputModel:
+    """
+    Analytical goodput model for a saturated link. All bus activity is a
+    sequence of transfers, each consisting of one master packet, the
+    turnaround to the slave, one slave packet and the turnaround back to the
+    master. Active directions always send full packets (SEND_PKTLEN payload
+    symbols).
+    """
+
+    def __init__(self, link_config, params):
+        """
+        link_config is a LinkConfig from TimingSolver.solve(), params a
+        LinkParams object.
+        """
+        self.link_config = link_config
+        self.params = params
+
+    def packet_time(self, config, payload_symbols):
+        """
+        Time in ns to transmit a packet with the given number of payload
+        symbols, using the average line bitrate of the TimingConfig.
+        """
+        symbols = packet_overhead + payload_symbols + self.params.gpio_rate * gpio_overhead
+        return symbols * 10 * 1000 / config.bandwidth
+
+    def predict(self, m2s_mix, s2m_mix):
+        """
+        Returns a GoodputResult for the given TrafficMix objects. Goodputs are
+        in MBit/s of TDATA payload, times are in ns per transfer.
+        """
+        p = self.params
+        m2s_payload = p.master_pktlen if m2s_mix.active else 0
+        s2m_payload = p.slave_pktlen if s2m_mix.active else 0
+
+        m2s_packet_time = self.packet_time(self.link_config.m2s, m2s_payload)
+        s2m_packet_time = self.packet_time(self.link_config.s2m, s2m_payload)
+
+        turnaround_time = max(p.slave_send_delay * p.slave_clk_period, p.master_recv_delay * p.master_clk_period)
+        turnaround_time += max(p.master_send_delay * p.master_clk_period, p.slave_recv_delay * p.slave_clk_period)
+
+        idle_time = 0
+        if p.idle_wait and m2s_payload < 64 and s2m_payload < 64:
+            idle_time = 32 * 1000 / self.link_config.m2s.bandwidth
+
+        cycle_time = m2s_packet_time + s2m_packet_time + turnaround_time + idle_time
+        m2s_words = m2s_payload / m2s_mix.symbols_per_word()
+        s2m_words = s2m_payload / s2m_mix.symbols_per_word()
+
+        return GoodputResult(1000 * m2s_words * m2s_mix.tdata_width / cycle_time,
+                1000 * s2m_words * s2m_mix.tdata_width / cycle_time, cycle_time,
+                m2s_packet_time, s2m_packet_time, turnaround_time, idle_time,
+                m2s_words, s2m_words)
+
+def format_goodput(result, link_config):
+    """
+    Returns a human readable report for a GoodputResult.
+    """
+    lines = [""]
+    lines.append("** GOODPUT PREDICTION **")
+    lines.append("    Transfer cycle: %.1f ns (M2S packet %.1f ns, S2M packet %.1f ns, turnaround %.1f ns, idle %.1f ns)" % (
+            result.cycle_time, result.m2s_packet_time, result.s2m_packet_time, result.turnaround_time, result.idle_time))
+    lines.append("    Master -> Slave: %8.2f MBit/s goodput (%.1f words/transfer, line rate %.2f MBit/s)" % (
+            result.m2s_goodput, result.m2s_words, link_config.m2s.bandwidth))
+    lines.append("    Slave -> Master: %8.2f MBit/s goodput (%.1f words/transfer, line rate %.2f MBit/s)" % (
+            result.s2m_goodput, result.s2m_words, link_config.s2m.bandwidth))
+    return "\n".join(lines)
+
+def usage():
+    print("""
+python goodput.py [options] <master-clk-period-ns> <slave-clk-period-ns> \\
+        <master-to-slave-max-pulse-jitter-ns> <slave-to-master-max-pulse-jitter-ns>
+
+    -M <n>, -S <n>
+        MASTER_PARBITS and SLAVE_PARBITS, default: 1
+
+    -d <m2s>,<s2m>
+        TDATA widths, default: 8,8
+
+    -u <m2s>,<s2m>
+        TUSER widths, default: 0,0
+
+    -t <m2s>,<s2m>
+        probability of a TUSER change per word, default: 0,0
+
+    -l <m2s>,<s2m>
+        probability of TLAST per word, default: 0,0
+
+    -P <master>,<slave>
+        MASTER_PKTLEN and SLAVE_PKTLEN, default: 64,64
+
+    -R <master>,<slave>
+        MASTER_RECV_DELAY and SLAVE_RECV_DELAY, default: 4,4
+
+    -D <master>,<slave>
+        MASTER_SEND_DELAY and SLAVE_SEND_DELAY, default: 32,32
+
+    -g <rate>
+        probability of a GPIO update per packet, default: 0
+
+    -i m2s|s2m
+        no AXIS traffic in the given direction
+
+    -n
+        do not model the random idle wait between short transfers
+""")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parbits = [1, 1]
+    tdata = [8, 8]
+    tuser = [0, 0]
+    toggle = [0.0, 0.0]
+    tlast = [0.0, 0.0]
+    pktlen = [64, 64]
+    recv_delay = [4, 4]
+    send_delay = [32, 32]
+    gpio_rate = 0.0
+    active = [True, True]
+    idle_wait = True
+
+    def pair(arg, conv):
+        values = [conv(v) for v in arg.split(",")]
+        if len(values) != 2:
+            usage()
+        return values
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "M:S:d:u:t:l:P:R:D:g:i:n")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-M":
+            parbits[0] = int(a)
+        elif o == "-S":
+            parbits[1] = int(a)
+        elif o == "-d":
+            tdata = pair(a, int)
+        elif o == "-u":
+            tuser = pair(a, int)
+        elif o == "-t":
+            toggle = pair(a, float)
+        elif o == "-l":
+            tlast = pair(a, float)
+        elif o == "-P":
+            pktlen = pair(a, int)
+        elif o == "-R":
+            recv_delay = pair(a, int)
+        elif o == "-D":
+            send_delay = pair(a, int)
+        elif o == "-g":
+            gpio_rate = float(a)
+        elif o == "-i" and a in ("m2s", "s2m"):
+            active[0 if a == "m2s" else 1] = False
+        elif o == "-n":
+            idle_wait = False
+        else:
+            usage()
+
+    if len(args) != 4:
+        usage()
+
+    master_clk_period, slave_clk_period, m2s_pulse_jitter, s2m_pulse_jitter = [float(a) for a in args]
+
+    params = LinkParams(master_clk_period, slave_clk_period, parbits[0], parbits[1],
+            recv_delay[0], recv_delay[1], send_delay[0], send_delay[1],
+            pktlen[0], pktlen[1], gpio_rate, idle_wait)
+    link_config = TimingSolver().solve(master_clk_period / parbits[0], slave_clk_period / parbits[1], m2s_pulse_jitter, s2m_pulse_jitter)
+
+    model = GoodputModel(link_config, params)
+    result = model.predict(TrafficMix(tdata[0], tuser[0], toggle[0], tlast[0], active[0]),
+            TrafficMix(tdata[1], tuser[1], toggle[1], tlast[1], active[1]))
+
+    print(format_goodput(result, link_config))
+    print()
@@ -0,0 +1,383 @@
+#!/usr/bin/python
+#
+# linksim.py is a transaction level simulator of the PonyLink TX/RX engine
+# (ponylink_txrx.v). It simulates the sequence of transfers (master packet,
+# turnaround, slave response, turnaround) with sequence IDs, acknowledges and
+# resends, the SEND_PKTLEN limit, the 255 symbol send window, the master
+# receive timeout, the random idle wait described in protocol.txt and GPIO
+# updates. Symbol errors are injected at a configurable rate.
+#
+# Example usage:
+#
+#   python linksim.py -e 1e-4 -L 20,10 -M 4 -S 2 4 10 0.5 0.5
+#
+# The timing and traffic options are the same as for goodput.py. Run
+# "python linksim.py" without arguments for a list of options.
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import math
+import getopt
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from timings import TimingSolver
+from goodput import LinkParams, TrafficMix, packet_overhead, gpio_overhead
+
+# Size of the send window: the TX fifo (256 entries) blocks when it holds
+# 255 symbols that have not been acknowledged by the peer yet.
+send_window = 255
+
+DirectionStats = namedtuple("DirectionStats", ["goodput", "words", "packets", "failed_packets",
+        "payload_symbols", "retransmission_rate", "latency_mean", "latency_percentiles", "gpio_latency"])
+
+SimResult = namedtuple("SimResult", ["time", "transfers", "timeouts", "m2s", "s2m"])
+
+latency_percentiles = (50, 90, 99, 99.9)
+
+class TrafficStream:
+    """
+    The AXIS traffic of one direction, as seen by the TX/RX engines. Words
+    are converted to payload symbols with TrafficMix.symbols_per_word(),
+    word k occupies the symbols up to word_end(k). With load = None the
+    source is saturated, otherwise words arrive as a Poisson process with
+    load MBit/s of TDATA.
+
+    All symbol positions are absolute counts, the 8 bit sequence IDs of the
+    protocol are these counts modulo 256.
+    """
+
+    def __init__(self, mix, load, rng):
+        self.mix = mix
+        self.spw = mix.symbols_per_word()
+        self.load = load
+        self.rng = rng
+        self.arrival = np.zeros(0)
+        self.base = 0
+        self.narrived = 0
+        self.next_arrival = 0.0
+        self.fill = 0
+        self.acked = 0
+        self.delivered = 0
+        self.sent_max = 0
+        self.latencies = []
+        self.words = 0
+        self.packets = 0
+        self.failed_packets = 0
+        self.payload_symbols = 0
+        self.resent_symbols = 0
+        self.gpio_pending = None
+        self.gpio_latencies = []
+
+    def word_end(self, k):
+        return int(math.floor((k + 1) * self.spw))
+
+    def words_before(self, position):
+        """
+        Returns the number of words that end at or before the given symbol
+        position.
+        """
+        n = max(0, int(math.ceil((position + 1) / self.spw)) - 1)
+        while n > 0 and self.word_end(n - 1) > position:
+            n -= 1
+        while self.word_end(n) <= position:
+            n += 1
+        return n
+
+    def _arrivals(self, count):
+        """
+        Makes sure the arrival times of at least count words are known.
+        """
+        while self.base + len(self.arrival) < count:
+            n = max(4096, len(self.arrival))
+            if self.load is None:
+                times = np.full(n, np.inf)
+            else:
+                gaps = self.rng.exponential(self.mix.tdata_width / (self.load * 1e-3), size=n)
+                times = self.next_arrival + np.cumsum(gaps)
+                self.next_arrival = times[-1]
+            self.arrival = np.concatenate([self.arrival, times])
+
+    def update(self, t):
+        """
+        Moves arrived words into the TX fifo (as far as the send window
+        allows) and returns the number of symbols in the fifo.
+        """
+        limit = self.acked + send_window
+        if self.load is None:
+            # saturated: words enter as soon as there is room for their first symbol
+            k = int(math.ceil(limit / self.spw))
+            self._arrivals(k)
+            new = self.arrival[self.narrived - self.base:k - self.base]
+            new[np.isinf(new)] = t
+            self.narrived = max(self.narrived, k)
+        else:
+            self._arrivals(self.narrived + 1)
+            while self.arrival[-1] <= t:
+                self._arrivals(self.base + len(self.arrival) + 1)
+            self.narrived = self.base + int(np.searchsorted(self.arrival, t, side="right"))
+        arrived = self.word_end(self.narrived - 1) if self.narrived else 0
+        self.fill = min(arrived, limit)
+        return self.fill - self.acked
+
+    def deliver(self, t, start, count):
+        """
+        The receiver got a packet with count payload symbols starting at
+        sequence position start. Payload is only accepted if it starts at
+        the next expected position.
+        """
+        if start != self.delivered or count == 0:
+            return
+        k0 = self.words_before(self.delivered)
+        self.delivered += count
+        k1 = self.words_before(self.delivered)
+        if k1 > k0:
+            self.latencies.append(t - self.arrival[k0 - self.base:k1 - self.base])
+            self.words += k1 - k0
+            if k0 - self.base > 65536:
+                self.arrival = self.arrival[k0 - self.base:]
+                self.base = k0
+
+    def stats(self, time):
+        lat = np.concatenate(self.latencies) if self.latencies else np.zeros(1)
+        gpio = np.mean(self.gpio_latencies) if self.gpio_latencies else 0.0
+        return DirectionStats(1000 * self.words * self.mix.tdata_width / time if time else 0.0, self.words,
+                self.packets, self.failed_packets, self.payload_symbols,
+                self.resent_symbols / self.payload_symbols if self.payload_symbols else 0.0,
+                float(np.mean(lat)), tuple(float(v) for v in np.percentile(lat, latency_percentiles)), gpio)
+
+class LinkSimulator:
+    """
+    Transaction level model of a master/slave pair. link_config is a
+    LinkConfig from TimingSolver.solve(), params a LinkParams object.
+    m2s_load and s2m_load are the offered loads in MBit/s of TDATA (None =
+    saturated, 0 = no traffic). gpio_rate is used as the probability that
+    the GPIO inputs of a side change during a transfer.
+    """
+
+    def __init__(self, link_config, params, m2s_mix, s2m_mix, m2s_load=None, s2m_load=None,
+            symbol_error_rate=0.0, seed=None):
+        self.link_config = link_config
+        self.params = params
+        self.symbol_error_rate = symbol_error_rate
+        self.random = random.Random(seed)
+        rng = np.random.RandomState(seed)
+        self.m2s = TrafficStream(m2s_mix, m2s_load if m2s_mix.active else 0, rng)
+        self.s2m = TrafficStream(s2m_mix, s2m_load if s2m_mix.active else 0, rng)
+        self.time = 0.0
+        self.transfers = 0
+        self.timeouts = 0
+
+        p = params
+        self.turnaround1 = max(p.slave_send_delay * p.slave_clk_period, p.master_recv_delay * p.master_clk_period)
+        self.turnaround2 = max(p.master_send_delay * p.master_clk_period, p.slave_recv_delay * p.slave_clk_period)
+        self.timeout = 200 * link_config.s2m.sample_timings[-1] * p.master_clk_period + p.master_send_delay * p.master_clk_period
+
+    def first_error(self, nsymbols):
+        """
+        Returns the index of the first corrupted symbol of a packet, or None
+        if the packet is received without errors.
+        """
+        q = 1 - self.symbol_error_rate
+        if q >= 1:
+            return None
+        u = self.random.random()
+        if u <= q ** nsymbols:
+            return None
+        return min(int(math.log(u) / math.log(q)), nsymbols - 1)
+
+    def send_packet(self, t, stream, pktlen, config):
+        """
+        Sends a packet with data from stream (which is also where the
+        sequence IDs come from). Returns (end time, received, responded,
+        payload symbols): received is true if the packet passed the
+        checksum, responded is true if the receiver switches to send mode.
+        The receiver still does that if only the last checksum byte is
+        wrong. Errors in the leading 0xb5 (the receiver syncs on K.28.7) and
+        in the tail symbol (sent after the last checksum byte) are harmless.
+        """
+        count = 0
+        if stream.load != 0:
+            count = min(pktlen, stream.update(t))
+        if stream.gpio_pending is None and self.random.random() < self.params.gpio_rate:
+            stream.gpio_pending = t
+        gpio = stream.gpio_pending is not None
+
+        nsymbols = packet_overhead + count + gpio_overhead * gpio
+        end = t + nsymbols * 10 * 1000 / config.bandwidth
+        stream.packets += 1
+        stream.payload_symbols += count
+        stream.resent_symbols += max(0, min(stream.sent_max, stream.acked + count) - stream.acked)
+        stream.sent_max = max(stream.sent_max, stream.acked + count)
+
+        error = self.first_error(nsymbols)
+        if error == 0:
+            error = self.first_error(nsymbols - 1)
+            error = None if error is None else error + 1
+        if error is not None and error < nsymbols - 1:
+            stream.failed_packets += 1
+            return end, False, error == nsymbols - 2, count
+
+        stream.deliver(end, stream.acked, count)
+        if gpio:
+            stream.gpio_latencies.append(end - stream.gpio_pending)
+            stream.gpio_pending = None
+        return end, True, True, count
+
+    def run(self, ntransfers):
+        """
+        Simulates ntransfers master packets (including resends) and returns
+        a SimResult. Can be called repeatedly to continue the simulation.
+        """
+        p = self.params
+        for i in range(ntransfers):
+            end, received, responded, m2s_count = self.send_packet(self.time, self.m2s, p.master_pktlen, self.link_config.m2s)
+            if received:
+                # the master tells the slave how much of its data arrived
+                self.s2m.acked = self.s2m.delivered
+
+            s2m_count = 0
+            next_time = end + self.timeout
+            if responded:
+                end, received, responded, s2m_count = self.send_packet(end + self.turnaround1,
+                        self.s2m, p.slave_pktlen, self.link_config.s2m)
+                if received:
+                    self.m2s.acked = self.m2s.delivered
+                if responded:
+                    next_time = end + self.turnaround2
+            if not responded:
+                self.timeouts += 1
+
+            if p.idle_wait and m2s_count < 64 and s2m_count < 64:
+                next_time += self.random.random() * 64 * 1000 / self.link_config.m2s.bandwidth
+            self.time = next_time
+            self.transfers += 1
+
+        return SimResult(self.time, self.transfers, self.timeouts, self.m2s.stats(self.time), self.s2m.stats(self.time))
+
+def format_simresult(result):
+    """
+    Returns a human readable report for a SimResult.
+    """
+    lines = [""]
+    lines.append("** LINK SIMULATION **")
+    lines.append("    %d transfers in %.3f us (%d timeouts)" % (result.transfers, result.time / 1000, result.timeouts))
+    for name, d in (("Master -> Slave", result.m2s), ("Slave -> Master", result.s2m)):
+        lines.append("")
+        lines.append("    %s:" % name)
+        lines.append("        goodput:        %8.2f MBit/s (%d words)" % (d.goodput, d.words))
+        lines.append("        packets:        %8d (%d failed, %.2f%%)" % (d.packets, d.failed_packets,
+                100 * d.failed_packets / d.packets if d.packets else 0))
+        lines.append("        retransmitted:  %8.2f%% of %d payload symbols" % (100 * d.retransmission_rate, d.payload_symbols))
+        lines.append("        latency:        %8.0f ns mean, %s" % (d.latency_mean,
+                ", ".join("p%g %.0f ns" % (q, v) for q, v in zip(latency_percentiles, d.latency_percentiles))))
+        if d.gpio_latency:
+            lines.append("        GPIO latency:   %8.0f ns mean" % d.gpio_latency)
+    return "\n".join(lines)
+
+def usage():
+    print("""
+python linksim.py [options] <master-clk-period-ns> <slave-clk-period-ns> \\
+        <master-to-slave-max-pulse-jitter-ns> <slave-to-master-max-pulse-jitter-ns>
+
+    -e <rate>
+        symbol error rate (per 10 bit symbol), default: 0
+
+    -L <m2s>,<s2m>
+        offered load in MBit/s of TDATA per direction, "sat" for a saturated
+        source, default: sat,sat
+
+    -N <n>
+        number of transfers to simulate, default: 100000
+
+    -r <seed>
+        random seed
+
+    The options -M, -S, -d, -u, -t, -l, -P, -R, -D, -g, -i and -n are the
+    same as for goodput.py. For -g the rate is the probability that the
+    GPIO inputs of a side change during a transfer.
+""")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parbits = [1, 1]
+    tdata = [8, 8]
+    tuser = [0, 0]
+    toggle = [0.0, 0.0]
+    tlast = [0.0, 0.0]
+    pktlen = [64, 64]
+    recv_delay = [4, 4]
+    send_delay = [32, 32]
+    gpio_rate = 0.0
+    active = [True, True]
+    idle_wait = True
+    symbol_error_rate = 0.0
+    load = [None, None]
+    ntransfers = 100000
+    seed = None
+
+    def pair(arg, conv):
+        values = [conv(v) for v in arg.split(",")]
+        if len(values) != 2:
+            usage()
+        return values
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "e:L:N:r:M:S:d:u:t:l:P:R:D:g:i:n")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-e":
+            symbol_error_rate = float(a)
+        elif o == "-L":
+            load = pair(a, lambda v: None if v == "sat" else float(v))
+        elif o == "-N":
+            ntransfers = int(a)
+        elif o == "-r":
+            seed = int(a)
+        elif o == "-M":
+            parbits[0] = int(a)
+        elif o == "-S":
+            parbits[1] = int(a)
+        elif o == "-d":
+            tdata = pair(a, int)
+        elif o == "-u":
+            tuser = pair(a, int)
+        elif o == "-t":
+            toggle = pair(a, float)
+        elif o == "-l":
+            tlast = pair(a, float)
+        elif o == "-P":
+            pktlen = pair(a, int)
+        elif o == "-R":
+            recv_delay = pair(a, int)
+        elif o == "-D":
+            send_delay = pair(a, int)
+        elif o == "-g":
+            gpio_rate = float(a)
+        elif o == "-i" and a in ("m2s", "s2m"):
+            active[0 if a == "m2s" else 1] = False
+        elif o == "-n":
+            idle_wait = False
+        else:
+            usage()
+
+    if len(args) != 4:
+        usage()
+
+    master_clk_period, slave_clk_period, m2s_pulse_jitter, s2m_pulse_jitter = [float(a) for a in args]
+
+    params = LinkParams(master_clk_period, slave_clk_period, parbits[0], parbits[1],
+            recv_delay[0], recv_delay[1], send_delay[0], send_delay[1],
+            pktlen[0], pktlen[1], gpio_rate, idle_wait)
+    link_config = TimingSolver().solve(master_clk_period / parbits[0], slave_clk_period / parbits[1], m2s_pulse_jitter, s2m_pulse_jitter)
+
+    sim = LinkSimulator(link_config, params, TrafficMix(tdata[0], tuser[0], toggle[0], tlast[0], active[0]),
+            TrafficMix(tdata[1], tuser[1], toggle[1], tlast[1], active[1]), load[0], load[1], symbol_error_rate, seed)
+    print(format_simresult(sim.run(ntransfers)))
+    print()
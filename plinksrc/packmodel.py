@@ -0,0 +1,290 @@
+#!/usr/bin/python
+#
+# packmodel.py is a bit-accurate software model of the PonyLink packer and
+# unpacker (ponylink_pack_8bits, ponylink_pack_generic and the matching
+# unpackers in ponylink_pack.v). It transforms a stream of AXIS words into the
+# stream of 9 bit symbols (data bytes and K.28.x control symbols) that is
+# passed to the TX/RX engine, and back.
+#
+# The xorshift32 scrambler is linear over GF(2), so blocks of consecutive RNG
+# states are computed from a precomputed table of the matrix powers instead of
+# stepping the RNG one byte at a time.
+#
+# Example usage:
+#
+#   from packmodel import Packer, Unpacker
+#   packer = Packer(tdata_width=16, tuser_width=2)
+#   symbols = packer.pack(tdata, tuser, tlast)
+#   tdata, tuser, tlast = Unpacker(16, 2).unpack(symbols)
+
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+# Initial RNG state after reset (see ponylink_pack.v).
+rng_seed = 123456789
+
+# A sync symbol (K.28.0) and the current RNG state are sent after every
+# sync_interval scrambled bytes.
+sync_interval = 4096
+
+sym_sync = 0x11c    # K.28.0
+sym_tuser = 0x15c   # K.28.2
+sym_tlast = 0x17c   # K.28.3
+
+def xorshift32(rng):
+    """
+    One step of the scrambler RNG.
+    """
+    rng ^= (rng << 13) & 0xffffffff
+    rng ^= rng >> 17
+    rng ^= (rng << 5) & 0xffffffff
+    return rng
+
+_rng_columns = None
+
+def rng_columns():
+    """
+    Returns an array of shape (sync_interval + 1, 32). Row k holds the
+    images of the 32 unit vectors under k steps of the RNG, i.e. the columns
+    of the GF(2) matrix M^k.
+    """
+    global _rng_columns
+    if _rng_columns is None:
+        cols = np.zeros((sync_interval + 1, 32), dtype=np.uint32)
+        v = np.uint32(1) << np.arange(32, dtype=np.uint32)
+        for k in range(sync_interval + 1):
+            cols[k] = v
+            v = v ^ (v << np.uint32(13))
+            v = v ^ (v >> np.uint32(17))
+            v = v ^ (v << np.uint32(5))
+        _rng_columns = cols
+    return _rng_columns
+
+def rng_states(rng, n):
+    """
+    Returns an array with the n + 1 consecutive RNG states starting with rng.
+    """
+    cols = rng_columns()
+    states = np.zeros(n + 1, dtype=np.uint32)
+    pos = 0
+    while pos <= n:
+        count = min(n + 1 - pos, sync_interval)
+        bits = ((rng >> np.arange(32)) & 1).astype(bool)
+        states[pos:pos+count] = np.bitwise_xor.reduce(cols[:count, bits], axis=1)
+        rng = int(np.bitwise_xor.reduce(cols[count, bits]))
+        pos += count
+    return states
+
+def word_bytes(values, width):
+    """
+    Returns the (n, nbytes) uint8 array of the values padded to a multiple
+    of 8 bits, LSB first. values is either an integer array (width <= 64)
+    or already an (n, nbytes) array of bytes. Bits above width are cleared.
+    """
+    nbytes = (width + 7) // 8
+    values = np.asarray(values)
+    if values.ndim == 2:
+        data = values.astype(np.uint8)
+        if data.shape[1] != nbytes:
+            raise ValueError("Expected %d bytes per word." % nbytes)
+    elif width > 64:
+        raise ValueError("Words wider than 64 bits must be given as byte arrays.")
+    else:
+        values = values.astype(np.uint64)
+        data = ((values[:, np.newaxis] >> (np.uint64(8) * np.arange(nbytes, dtype=np.uint64))) & np.uint64(0xff)).astype(np.uint8)
+    if width % 8 != 0 and nbytes > 0:
+        data[:, -1] &= (1 << (width % 8)) - 1
+    return data
+
+def word_values(data, width):
+    """
+    Inverse of word_bytes(): returns an uint64 array for width <= 64 and the
+    byte array itself otherwise.
+    """
+    if width > 64:
+        return data
+    values = np.zeros(len(data), dtype=np.uint64)
+    for i in range(data.shape[1]):
+        values |= data[:, i].astype(np.uint64) << np.uint64(8 * i)
+    return values
+
+class Packer:
+    """
+    Streaming model of ponylink_pack_8bits and ponylink_pack_generic. Both
+    create the same symbol stream: TDATA and TUSER are padded to a multiple
+    of 8 bits and sent LSB first, each word is preceded by K.28.3 if TLAST
+    is set and by K.28.2 and the new TUSER value if TUSER changed. The packer
+    state (RNG, sync counter, last TUSER value) is kept between calls to
+    pack(), so a long stream can be packed in chunks.
+    """
+
+    def __init__(self, tdata_width=8, tuser_width=0):
+        """
+        With tuser_width = 0, TUSER is ignored (no K.28.2 symbols are sent).
+        """
+        self.tdata_width = tdata_width
+        self.tuser_width = tuser_width
+        self.rng = rng_seed
+        self.scrambled = 0
+        self.last_tuser = np.zeros((tuser_width + 7) // 8, dtype=np.uint8)
+        self.pending_sync = True
+
+    def pack(self, tdata, tuser=None, tlast=None):
+        """
+        Packs the given words and returns the array of 9 bit symbols. tdata
+        and tuser are integer arrays or arrays of bytes (see word_bytes()),
+        tuser and tlast are optional.
+        """
+        tdata = word_bytes(tdata, self.tdata_width)
+        n = len(tdata)
+        tlast = np.zeros(n, dtype=bool) if tlast is None else np.asarray(tlast, dtype=bool)
+        tdata_bytes = tdata.shape[1]
+        tuser_bytes = len(self.last_tuser)
+
+        if tuser_bytes > 0 and tuser is not None and n > 0:
+            tuser = word_bytes(tuser, self.tuser_width)
+            previous = np.vstack([self.last_tuser[np.newaxis, :], tuser[:-1]])
+            send_tuser = np.any(tuser != previous, axis=1)
+            self.last_tuser = tuser[-1].copy()
+        else:
+            tuser = np.zeros((n, tuser_bytes), dtype=np.uint8)
+            send_tuser = np.zeros(n, dtype=bool)
+            if tuser_bytes > 0 and n > 0 and np.any(self.last_tuser):
+                send_tuser[0] = True
+                self.last_tuser[:] = 0
+
+        # per word: [K.28.3] [K.28.2 tuser bytes] tdata bytes
+        length = tlast + send_tuser * (1 + tuser_bytes) + tdata_bytes
+        end = np.cumsum(length)
+        symbols = np.zeros(end[-1] if n else 0, dtype=np.int64)
+        scrambled = np.zeros(len(symbols), dtype=bool)
+        start = end - length
+        symbols[start[tlast]] = sym_tlast
+        pos = (start + tlast)[send_tuser]
+        symbols[pos] = sym_tuser
+        if tuser_bytes > 0:
+            index = pos[:, np.newaxis] + 1 + np.arange(tuser_bytes)
+            symbols[index] = tuser[send_tuser]
+            scrambled[index] = True
+        index = (end - tdata_bytes)[:, np.newaxis] + np.arange(tdata_bytes)
+        symbols[index] = tdata
+        scrambled[index] = True
+
+        nscrambled = int(np.sum(scrambled))
+        states = rng_states(self.rng, nscrambled)
+        symbols[scrambled] ^= states[:-1] & 0xff
+
+        # sync sequences: at reset and after every sync_interval scrambled bytes
+        index = self.scrambled + np.arange(1, nscrambled + 1)
+        after = np.flatnonzero(index % sync_interval == 0)
+        insert_at = list(np.flatnonzero(scrambled)[after] + 1)
+        sync_states = list(states[after + 1])
+        if self.pending_sync:
+            insert_at.insert(0, 0)
+            sync_states.insert(0, self.rng)
+            self.pending_sync = False
+
+        if insert_at:
+            seqs = [[sym_sync] + [(int(s) >> (8*i)) & 0xff for i in range(4)] for s in sync_states]
+            symbols = np.insert(symbols, np.repeat(insert_at, 5), np.concatenate(seqs))
+
+        self.rng = int(states[-1])
+        self.scrambled += nscrambled
+        return symbols
+
+class Unpacker:
+    """
+    Streaming model of ponylink_unpack_8bits and ponylink_unpack_generic.
+    Symbols that belong to an incomplete word (or sync sequence) at the end
+    of the input are kept for the next call to unpack().
+    """
+
+    def __init__(self, tdata_width=8, tuser_width=0):
+        self.tdata_width = tdata_width
+        self.tuser_width = tuser_width
+        self.rng = rng_seed
+        self.tuser = np.zeros((tuser_width + 7) // 8, dtype=np.uint8)
+        self.pending = np.zeros(0, dtype=np.int64)
+
+    def unpack(self, symbols):
+        """
+        Returns a tuple (tdata, tuser, tlast) with the complete words in the
+        symbol stream so far. tdata and tuser are returned as integer arrays
+        for widths up to 64 bits and as byte arrays otherwise (see
+        word_values()). Raises ValueError on symbols the packer never sends.
+        """
+        symbols = np.concatenate([self.pending, np.asarray(symbols, dtype=np.int64)])
+        tdata_bytes = (self.tdata_width + 7) // 8
+        tuser_bytes = len(self.tuser)
+
+        sync = np.flatnonzero(symbols == sym_sync)
+        seed = np.zeros(len(symbols), dtype=bool)
+        for i in range(1, 5):
+            seed[sync[sync + i < len(symbols)] + i] = True
+        control = symbols >= 0x100
+        other = control & (symbols != sym_sync) & (symbols != sym_tlast) & ((symbols != sym_tuser) | (tuser_bytes == 0))
+        if np.any(other):
+            raise ValueError("Unexpected control symbol 0x%03x." % symbols[np.flatnonzero(other)[0]])
+        data = np.flatnonzero(~control & ~seed)
+
+        # role of each scrambled byte: tuser bytes directly follow K.28.2
+        tuser_start = np.zeros(len(symbols), dtype=bool)
+        tuser_start[np.flatnonzero(symbols[:-1] == sym_tuser) + 1] = True
+        marker = np.where(tuser_start[data], np.arange(len(data)), -1)
+        marker = np.maximum.accumulate(marker) if len(data) else marker
+        offset = np.arange(len(data)) - np.maximum(marker, 0)
+        is_tuser = (marker >= 0) & (offset < tuser_bytes)
+        tdata_index = np.where(marker >= 0, offset - tuser_bytes, np.arange(len(data))) % max(tdata_bytes, 1)
+
+        # complete words end with their last tdata byte
+        word_end = ~is_tuser & (tdata_index == tdata_bytes - 1)
+        nwords = int(np.sum(word_end))
+        if nwords == 0:
+            self.pending = symbols
+            return word_values(np.zeros((0, tdata_bytes), dtype=np.uint8), self.tdata_width), \
+                    word_values(np.zeros((0, tuser_bytes), dtype=np.uint8), self.tuser_width), np.zeros(0, dtype=bool)
+        last = np.flatnonzero(word_end)[-1]
+        cut = data[last] + 1
+        data = data[:last+1]
+        is_tuser = is_tuser[:last+1]
+        tdata_index = tdata_index[:last+1]
+
+        # descramble, the RNG is reloaded from the seed after each sync
+        values = symbols[data].copy()
+        segment = np.searchsorted(sync, data)
+        rng = self.rng
+        for k in range(len(sync) + 1):
+            if k > 0:
+                if sync[k-1] >= cut:
+                    break
+                rng = sum(int(symbols[sync[k-1] + 1 + i]) << (8*i) for i in range(4))
+            sel = np.flatnonzero(segment == k)
+            states = rng_states(rng, len(sel))
+            values[sel] ^= states[:-1] & 0xff
+            rng = int(states[-1])
+
+        word = np.cumsum(~is_tuser & (tdata_index == 0)) - 1
+        tdata = np.zeros((nwords, tdata_bytes), dtype=np.uint8)
+        tdata[word[~is_tuser], tdata_index[~is_tuser]] = values[~is_tuser]
+
+        # TUSER keeps its value until the next K.28.2
+        tuser = np.zeros((nwords, tuser_bytes), dtype=np.uint8)
+        if tuser_bytes > 0:
+            new_tuser = np.zeros(nwords, dtype=bool)
+            tuser_word = word[is_tuser] + 1
+            tuser[tuser_word, offset[:last+1][is_tuser]] = values[is_tuser]
+            new_tuser[tuser_word] = True
+            source = np.maximum.accumulate(np.where(new_tuser, np.arange(nwords), -1))
+            tuser = np.where((source >= 0)[:, np.newaxis], tuser[np.maximum(source, 0)], self.tuser)
+            self.tuser = tuser[-1].copy()
+
+        # K.28.3 applies to the next word
+        tlast = np.zeros(nwords, dtype=bool)
+        tlast_pos = np.flatnonzero(symbols[:cut] == sym_tlast)
+        tlast[np.searchsorted(data[~is_tuser & (tdata_index == 0)], tlast_pos)] = True
+
+        self.rng = rng
+        self.pending = symbols[cut:]
+        return word_values(tdata, self.tdata_width), word_values(tuser, self.tuser_width), tlast
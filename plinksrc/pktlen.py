@@ -0,0 +1,190 @@
+#!/usr/bin/python
+#
+# pktlen.py finds the best MASTER_PKTLEN/SLAVE_PKTLEN setting for a link with
+# a given symbol error rate. Longer packets have less per-packet overhead,
+# but a transmission error costs more time, because the whole transfer has
+# to be repeated (see "Sequence IDs" and "Error handling" in protocol.txt).
+#
+# Example usage:
+#
+#   python pktlen.py -e 1e-4 -M 4 -S 2 4 10 0.5 0.5
+#
+# The timing and traffic options are the same as for goodput.py. Run
+# "python pktlen.py" without arguments for a list of options.
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import getopt
+from collections import namedtuple
+
+from timings import TimingSolver
+from goodput import GoodputModel, LinkParams, TrafficMix, packet_overhead, gpio_overhead
+
+# Largest payload per packet (see "Packet format" in protocol.txt).
+max_pktlen = 64
+
+PacketLengthResult = namedtuple("PacketLengthResult", ["pktlen", "success_rate", "transfer_time",
+        "m2s_goodput", "s2m_goodput", "m2s_latency", "s2m_latency", "feasible"])
+
+def evaluate_pktlen(link_config, params, m2s_mix, s2m_mix, symbol_error_rate, pktlen):
+    """
+    Returns a PacketLengthResult for MASTER_PKTLEN = SLAVE_PKTLEN = pktlen.
+
+    A transfer succeeds when both the master packet and the slave response
+    are received without error. Otherwise the master waits for the receive
+    timeout (200 * TIMING_R5 master clock cycles, as implemented in
+    ponylink_txrx) and then resends. Payload is only accepted by the peer if
+    it starts at the expected sequence ID, which means that both
+    directions move forward only on successful transfers. Latencies are the
+    mean time from a word becoming ready to its delivery, including the wait
+    for the start of the next transfer.
+
+    The receive timeout of the master runs from the end of its own packet,
+    whatever arrives on the line. A packet length is feasible only if the
+    turnaround and the slave packet fit into the timeout, otherwise the
+    master gives up in the middle of every response.
+    """
+    params = params._replace(master_pktlen=pktlen, slave_pktlen=pktlen)
+    model = GoodputModel(link_config, params)
+    nominal = model.predict(m2s_mix, s2m_mix)
+
+    m2s_symbols = packet_overhead + (pktlen if m2s_mix.active else 0) + params.gpio_rate * gpio_overhead
+    s2m_symbols = packet_overhead + (pktlen if s2m_mix.active else 0) + params.gpio_rate * gpio_overhead
+    success_rate = (1 - symbol_error_rate) ** (m2s_symbols + s2m_symbols)
+
+    timeout = 200 * link_config.s2m.sample_timings[-1] * params.master_clk_period
+    feasible = nominal.turnaround_time + nominal.s2m_packet_time <= timeout
+    failed_time = nominal.m2s_packet_time + timeout
+    transfer_time = success_rate * nominal.cycle_time + (1 - success_rate) * failed_time
+
+    m2s_goodput = 1000 * success_rate * nominal.m2s_words * m2s_mix.tdata_width / transfer_time
+    s2m_goodput = 1000 * success_rate * nominal.s2m_words * s2m_mix.tdata_width / transfer_time
+
+    retry_time = transfer_time / 2 + (1 / success_rate - 1) * transfer_time
+    m2s_latency = retry_time + nominal.m2s_packet_time
+    s2m_latency = retry_time + nominal.m2s_packet_time + nominal.turnaround_time / 2 + nominal.s2m_packet_time
+
+    return PacketLengthResult(pktlen, success_rate, transfer_time, m2s_goodput, s2m_goodput, m2s_latency, s2m_latency, feasible)
+
+def optimize_pktlen(link_config, params, m2s_mix, s2m_mix, symbol_error_rate, pktlens=None):
+    """
+    Evaluates all packet lengths in pktlens (default: 1 .. max_pktlen) and
+    returns a tuple (best, results), with best being the feasible result
+    with the highest combined goodput of both directions (None if no packet
+    length is feasible).
+    """
+    if pktlens is None:
+        pktlens = range(1, max_pktlen+1)
+    results = [evaluate_pktlen(link_config, params, m2s_mix, s2m_mix, symbol_error_rate, n) for n in pktlens]
+    feasible = [r for r in results if r.feasible]
+    best = max(feasible, key=lambda r: r.m2s_goodput + r.s2m_goodput) if feasible else None
+    return best, results
+
+def usage():
+    print("""
+python pktlen.py [options] <master-clk-period-ns> <slave-clk-period-ns> \\
+        <master-to-slave-max-pulse-jitter-ns> <slave-to-master-max-pulse-jitter-ns>
+
+    -e <rate>
+        symbol error rate (per 10 bit symbol), default: 1e-5
+
+    -b <rate>
+        bit error rate, alternative to -e
+
+    -s <n>
+        only print every n-th packet length, default: 8
+
+    The options -M, -S, -d, -u, -t, -l, -R, -D, -g, -i and -n are the same
+    as for goodput.py.
+""")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parbits = [1, 1]
+    tdata = [8, 8]
+    tuser = [0, 0]
+    toggle = [0.0, 0.0]
+    tlast = [0.0, 0.0]
+    recv_delay = [4, 4]
+    send_delay = [32, 32]
+    gpio_rate = 0.0
+    active = [True, True]
+    idle_wait = True
+    symbol_error_rate = 1e-5
+    step = 8
+
+    def pair(arg, conv):
+        values = [conv(v) for v in arg.split(",")]
+        if len(values) != 2:
+            usage()
+        return values
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "e:b:s:M:S:d:u:t:l:R:D:g:i:n")
+    except getopt.GetoptError:
+        usage()
+
+    for o, a in opts:
+        if o == "-e":
+            symbol_error_rate = float(a)
+        elif o == "-b":
+            symbol_error_rate = 1 - (1 - float(a)) ** 10
+        elif o == "-s":
+            step = int(a)
+        elif o == "-M":
+            parbits[0] = int(a)
+        elif o == "-S":
+            parbits[1] = int(a)
+        elif o == "-d":
+            tdata = pair(a, int)
+        elif o == "-u":
+            tuser = pair(a, int)
+        elif o == "-t":
+            toggle = pair(a, float)
+        elif o == "-l":
+            tlast = pair(a, float)
+        elif o == "-R":
+            recv_delay = pair(a, int)
+        elif o == "-D":
+            send_delay = pair(a, int)
+        elif o == "-g":
+            gpio_rate = float(a)
+        elif o == "-i" and a in ("m2s", "s2m"):
+            active[0 if a == "m2s" else 1] = False
+        elif o == "-n":
+            idle_wait = False
+        else:
+            usage()
+
+    if len(args) != 4:
+        usage()
+
+    master_clk_period, slave_clk_period, m2s_pulse_jitter, s2m_pulse_jitter = [float(a) for a in args]
+
+    params = LinkParams(master_clk_period, slave_clk_period, parbits[0], parbits[1],
+            recv_delay[0], recv_delay[1], send_delay[0], send_delay[1],
+            gpio_rate=gpio_rate, idle_wait=idle_wait)
+    link_config = TimingSolver().solve(master_clk_period / parbits[0], slave_clk_period / parbits[1], m2s_pulse_jitter, s2m_pulse_jitter)
+    m2s_mix = TrafficMix(tdata[0], tuser[0], toggle[0], tlast[0], active[0])
+    s2m_mix = TrafficMix(tdata[1], tuser[1], toggle[1], tlast[1], active[1])
+
+    best, results = optimize_pktlen(link_config, params, m2s_mix, s2m_mix, symbol_error_rate)
+
+    print()
+    print("** PACKET LENGTH vs. GOODPUT (symbol error rate %g) **" % symbol_error_rate)
+    print()
+    print("    PKTLEN   success   M2S MBit/s   S2M MBit/s   M2S latency   S2M latency")
+    for r in results:
+        if r.pktlen % step == 0 or r.pktlen in (1, max_pktlen) or r is best:
+            print("    %6d   %6.2f%%   %10.2f   %10.2f   %8.0f ns   %8.0f ns%s" % (r.pktlen, 100 * r.success_rate,
+                    r.m2s_goodput, r.s2m_goodput, r.m2s_latency, r.s2m_latency,
+                    "  <==" if r is best else "" if r.feasible else "  (exceeds receive timeout)"))
+    print()
+    if best is None:
+        print("No packet length fits into the receive timeout of the master.")
+        print()
+        sys.exit(1)
+    print("RECOMMENDED: .MASTER_PKTLEN(%d), .SLAVE_PKTLEN(%d)" % (best.pktlen, best.pktlen))
+    print()
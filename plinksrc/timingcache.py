@@ -0,0 +1,115 @@
+#!/usr/bin/python
+#
+# timingcache.py provides a memoizing wrapper around TimingSolver from
+# timings.py. Solved configurations are kept in an in-process LRU cache and
+# optionally in an sqlite database on disk, so repeated regression and sweep
+# runs do not need to re-solve the same (send_period, recv_period, jitter)
+# tuples over and over again.
+#
+# The on-disk store is versioned by a hash of the timings.py source code, so
+# entries created by an older version of the solver are never used.
+#
+# Example usage:
+#
+#   from timingcache import CachedTimingSolver
+#   solver = CachedTimingSolver("timings.cache")
+#   link = solver.solve(6, 19, 0.25, 1.5)
+#
+# Set the PONYLINK_TIMING_CACHE environment variable to the name of a cache
+# file to enable the on-disk store in timings.py and testbench/maketest.py.
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import atexit
+import sqlite3
+import hashlib
+import inspect
+from collections import OrderedDict
+
+import timings
+from timings import TimingSolver, TimingConfig
+
+solver_version = hashlib.sha1(inspect.getsource(timings).encode("utf-8")).hexdigest()
+
+class CachedTimingSolver(TimingSolver):
+    """
+    A TimingSolver that memoizes solve_direction() (and therefore also
+    solve() and find_config()).
+
+    filename is the name of an optional sqlite database used as persistent
+    store. maxsize is the number of entries kept in the in-process LRU cache.
+    lendist is passed on to TimingSolver and is part of the cache key.
+    The hits, db_hits and misses members count LRU hits, hits in the on-disk
+    store and actual solver runs. Each new entry is committed right away, so
+    several processes can share one store (sqlite waits up to 60 seconds for
+    a lock held by another process).
+    """
+
+    def __init__(self, filename=None, maxsize=4096, lendist=None):
+        TimingSolver.__init__(self, lendist)
+        self.maxsize = maxsize
+        self.lru = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.db = None
+        if filename is not None:
+            self.db = sqlite3.connect(filename, timeout=60)
+            self.db.execute("CREATE TABLE IF NOT EXISTS configs (key TEXT PRIMARY KEY, value TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (version TEXT)")
+            row = self.db.execute("SELECT version FROM meta").fetchone()
+            if row is None or row[0] != solver_version:
+                self.db.execute("DELETE FROM configs")
+                self.db.execute("DELETE FROM meta")
+                self.db.execute("INSERT INTO meta VALUES (?)", (solver_version,))
+                self.db.commit()
+            atexit.register(self.close)
+
+    def close(self):
+        """
+        Close the on-disk store.
+        """
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def solve_direction(self, send_period, recv_period, pulse_jitter, reference=False):
+        key = json.dumps([repr(float(send_period)), repr(float(recv_period)), repr(float(pulse_jitter)), self.lendist])
+
+        if key in self.lru:
+            self.hits += 1
+            config = self.lru.pop(key)
+            self.lru[key] = config
+            return config
+
+        config = None
+        if self.db is not None:
+            row = self.db.execute("SELECT value FROM configs WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                v = json.loads(row[0])
+                config = TimingConfig(send_period, recv_period, pulse_jitter, tuple(v[0]), tuple(v[1]),
+                        tuple(tuple(w) for w in v[2]), tuple(v[3]), v[4], tuple(v[5]))
+                self.db_hits += 1
+
+        if config is None:
+            self.misses += 1
+            config = TimingSolver.solve_direction(self, send_period, recv_period, pulse_jitter, reference)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO configs VALUES (?, ?)", (key, json.dumps(list(config[3:]))))
+                self.db.commit()
+
+        self.lru[key] = config
+        if len(self.lru) > self.maxsize:
+            self.lru.popitem(last=False)
+        return config
+
+def get_solver():
+    """
+    Returns a CachedTimingSolver that uses the file named in the
+    PONYLINK_TIMING_CACHE environment variable (if set) as persistent store.
+    """
+    return CachedTimingSolver(os.environ.get("PONYLINK_TIMING_CACHE"))
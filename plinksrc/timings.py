@@ -12,6 +12,24 @@
 #
 # All parameters are given in nanoseconds.
 #
+# Instead of the jitter parameters, the pulse width histograms measured on a
+# board with "analyzer.py -J" can be used. The pulse jitter of each direction
+# is then derived from the measured widths (offset of the mean from the
+# nominal width plus a configurable number of standard deviations, default 6)
+# and the bandwidth of the new configuration is compared with the timings
+# used in the capture (unless those already fail the margin under the
+# measured jitter):
+#
+# python timings.py -measured jitter.json 6 19 6
+#                             |           |  |  |
+#  Output of analyzer.py -J --+           |  |  Margin in standard deviations
+#                                         |  |
+#                      Master clock period   Slave clock period
+#
+# The report has an entry for each direction of the capture. If a direction
+# was captured with more than one timing profile, two more arguments select
+# the timing profiles of the master to slave and slave to master direction.
+#
 # Please refer to the "protocol.txt" file for a more detailed explanation of
 # how to use this tool.
 
@@ -19,8 +37,169 @@ from __future__ import division
 from __future__ import print_function
 
 import sys
+import math
 import numpy as np
-import matplotlib.pyplot as plt
+from collections import namedtuple
+
+class TimingConfig(namedtuple("TimingConfig", ["send_period", "recv_period", "pulse_jitter",
+        "transmit_timings", "sample_timings", "sample_windows", "bitrates", "bandwidth", "lendist"])):
+    """
+    Immutable result of solving one direction of the link (see
+    TimingSolver.solve_direction()).
+
+    transmit_timings and sample_timings are tuples with one entry per bit
+    length, sample_windows is a tuple of (minsamples, maxsamples) pairs,
+    bitrates holds the bitrate in MBit/s for each pulse length and bandwidth
+    is the average bitrate in MBit/s, weighted with the pulse length
+    distribution in lendist.
+    """
+    __slots__ = ()
+
+class LinkConfig(namedtuple("LinkConfig", ["m2s", "s2m", "master_timings", "slave_timings"])):
+    """
+    Immutable result of solving both directions of a link (see
+    TimingSolver.solve()).  m2s and s2m are TimingConfig objects,
+    master_timings and slave_timings are the packed 80 bit values for the
+    MASTER_TIMINGS and SLAVE_TIMINGS core parameters.
+    """
+    __slots__ = ()
+
+# Variance (in samples^2) that the quantization of both edges of a pulse to
+# the sample clock adds to its measured width, for a random sampling phase.
+quantization_variance = 1/6
+
+def histogram_moments(hist, first=0):
+    """
+    Returns (count, mean, variance, min, max) of a histogram of pulse widths,
+    with hist[0] counting the pulses of width first. Raises ValueError for a
+    histogram without pulses.
+    """
+    hist = np.asarray(hist, dtype=np.float64)
+    nonzero = np.flatnonzero(hist)
+    if len(nonzero) == 0 or np.any(hist < 0):
+        raise ValueError("empty or negative pulse width histogram")
+    values = first + np.arange(len(hist))
+    count = int(hist.sum())
+    mean = float(hist.dot(values)) / count
+    variance = float(hist.dot((values - mean)**2)) / count
+    return count, mean, variance, int(values[nonzero[0]]), int(values[nonzero[-1]])
+
+def fit_cycle(counts, means, timings):
+    """
+    Returns the transmitter cycle as the least squares fit of the mean pulse
+    widths of the pulse classes (each weighted with its count) to the timing
+    profile.
+    """
+    return sum(n * m * t for n, m, t in zip(counts, means, timings)) / sum(n * t**2 for n, t in zip(counts, timings))
+
+class MeasuredJitter(namedtuple("MeasuredJitter", ["timings", "cycle", "bits", "nominal", "offset", "sigma", "peak", "pulse_jitter"])):
+    """
+    Immutable result of measured_jitter() for one direction. timings is the
+    timing profile of the capture and cycle the transmitter cycle in ns.
+    bits, nominal, offset, sigma and peak are tuples with one entry per pulse
+    class: the pulse length in bits, the nominal pulse width, the offset of
+    the mean width from it, the standard deviation of the widths and the
+    largest measured deviation from the nominal width, all in ns.
+    pulse_jitter is the derived jitter bound for TimingSolver.
+    """
+    __slots__ = ()
+
+def measured_jitter(profile, sample_period, sigmas=6):
+    """
+    Derives the pulse jitter of one direction from the pulse width
+    histograms measured by analyzer.py -J (one entry of its "profiles"
+    list, with widths in samples of sample_period ns) and returns a
+    MeasuredJitter. Raises ValueError unless the profile has a non-empty
+    histogram for each of the 5 pulse classes.
+
+    The cycle is fitted with fit_cycle(). The measured widths include the
+    quantization_variance, which is subtracted from the variance. The pulse
+    jitter is the largest offset plus sigmas standard deviations over all
+    pulse classes.
+    """
+    try:
+        profile_timings = list(profile["timings"])
+        classes = dict((c["bits"], c) for c in profile["classes"])
+        if len(profile["classes"]) != 5 or sorted(classes) != [1, 2, 3, 4, 5]:
+            raise ValueError("need one histogram for each of the 1 .. 5 bit pulses, got %s" %
+                    sorted(c["bits"] for c in profile["classes"]))
+        classes = [classes[bits] for bits in range(1, 6)]
+        timings = [c["timing"] for c in classes]
+        moments = list()
+        for c in classes:
+            try:
+                moments.append(histogram_moments(c["histogram"]["counts"], c["histogram"]["first"]))
+            except ValueError as e:
+                raise ValueError("%d bit pulses: %s" % (c["bits"], e))
+    except (KeyError, TypeError) as e:
+        raise ValueError("missing or malformed entry %s" % e)
+
+    counts, means, variances, lows, highs = zip(*moments)
+    cycle = fit_cycle(counts, means, timings)
+    nominal = [t * cycle for t in timings]
+    offset = [abs(m - w) for m, w in zip(means, nominal)]
+    sigma = [math.sqrt(max(v - quantization_variance, 0)) for v in variances]
+    peak = [max(w - lo, hi - w) for w, lo, hi in zip(nominal, lows, highs)]
+    pulse_jitter = max(o + sigmas * s for o, s in zip(offset, sigma))
+    return MeasuredJitter(profile_timings, cycle * sample_period, tuple(c["bits"] for c in classes),
+            tuple(w * sample_period for w in nominal), tuple(o * sample_period for o in offset),
+            tuple(s * sample_period for s in sigma), tuple(p * sample_period for p in peak),
+            pulse_jitter * sample_period)
+
+def format_measured_jitter(jitter, direction):
+    """
+    Returns the human readable report for a MeasuredJitter.
+    """
+    lines = [""]
+    lines.append("** MEASURED PULSE JITTER FOR DIRECTION '%s' **" % ("MASTER -> SLAVE" if direction == 0 else "SLAVE -> MASTER"))
+    lines.append("Timing profile %s with transmitter cycle %.3f ns" % (jitter.timings, jitter.cycle))
+    for k in range(len(jitter.nominal)):
+        lines.append("    @%d: nominal %7.3f ns, offset %.3f ns, sigma %.3f ns, peak deviation %.3f ns" % (jitter.bits[k],
+                jitter.nominal[k], jitter.offset[k], jitter.sigma[k], jitter.peak[k]))
+    lines.append("    ==> pulse jitter %.3f ns" % jitter.pulse_jitter)
+    return "\n".join(lines)
+
+def pack_timings(transmit_timings, sample_timings):
+    """
+    Pack the transmit timings of one direction and the sample timings of the
+    other direction into the 80 bit TIMINGS parameter value of one core.
+    """
+    value = 0
+    for i in range(len(transmit_timings)):
+        value |= transmit_timings[i] << (8*i + 40)
+        value |= sample_timings[i] << (8*i)
+    return value
+
+def format_config(config, direction):
+    """
+    Returns the human readable report for a TimingConfig, as printed by
+    TimingSolver.find_config().
+    """
+    lines = [""]
+    lines.append("** FINDING TIMING CONFIG FOR DIRECTION '%s' **" % ("MASTER -> SLAVE" if direction == 0 else "SLAVE -> MASTER"))
+    lines.append("Timing for transmit_period=%.3f ns (%.2f MHz) and sample_period=%.3f ns (%.2f MHz)" % (config.send_period,
+            1000 / config.send_period, config.recv_period, 1000 / config.recv_period))
+    lines.append("    transmit timings: %s" % list(config.transmit_timings))
+    for bits in range(1, len(config.sample_windows)+1):
+        minsamples, maxsamples = config.sample_windows[bits-1]
+        lines.append("    %2d - %2d identical samples  -> %d bit%s" % (minsamples, maxsamples, bits, "s" if bits != 1 else ""))
+    lines.append("Bitrate vs. pulse length:")
+    for bits in range(1, len(config.bitrates)+1):
+        lines.append("    @%d: %6.2f MBit/s  (expected %2d%%)" % (bits, config.bitrates[bits-1], 100*config.lendist[bits-1]))
+    lines.append("    ==> %6.2f MBit/s  (expected avg.)" % config.bandwidth)
+    lines.append("TRANSMIT TIMINGS: %s" % list(config.transmit_timings))
+    lines.append("SAMPLE TIMINGS: %s" % list(config.sample_timings))
+    return "\n".join(lines)
+
+def format_core_config(link):
+    """
+    Returns the core parameter settings for a LinkConfig.
+    """
+    lines = [""]
+    lines.append("** CORE CONFIGURATION **")
+    lines.append(".MASTER_TIMINGS(80'h%020x)," % link.master_timings)
+    lines.append(".SLAVE_TIMINGS(80'h%020x)" % link.slave_timings)
+    return "\n".join(lines)
 
 class TimingSolver:
     """
@@ -107,9 +286,16 @@ class TimingSolver:
     Reliably computing these bounded ranges is the purpose of this class.
     """
 
-    def __init__(self):
-        # the values for self.lendist come from bitdist.py
-        self.lendist = [ 0.32735297, 0.36519647, 0.21898804, 0.07264801, 0.0158145 ]
+    # the values for lendist come from bitdist.py (exact Markov chain result)
+    lendist = [ 0.32747272, 0.36542509, 0.21896230, 0.07236540, 0.01577449 ]
+
+    def __init__(self, lendist=None):
+        """
+        lendist optionally overrides the default pulse length distribution
+        (fractions of bits sent in pulses of 1 .. 5 bit times, see
+        bitdist.py).
+        """
+        self.lendist = [float(v) for v in (TimingSolver.lendist if lendist is None else lendist)]
         self.results = { }
 
     def test_recv_timings(self, transmit_period, sample_period, pulse_jitter, transmit_timings, verbose):
@@ -161,35 +347,349 @@ class TimingSolver:
             sample_timings.append(minsamples)
         return sample_timings
 
-    def find_config(self, direction, send_period, recv_period, pulse_jitter):
+    def find_transmit_timings(self, send_period, recv_period, pulse_jitter, reference=False):
         """
-        Compute and report the timing configuration needed by a master and/or slave to its peer.
+        Returns the list of the shortest collision-free transmit timings for
+        each bit length.
+
+        The transmit timing for each bit length is computed directly from the
+        maxsamples of the previous bit length, and then only the new bit
+        length is checked (and corrected by +/- 1 for floating point
+        rounding), using the same expressions as test_recv_timings().
+
+        If reference is truthy, the original search is used instead: each
+        transmit timing is incremented by one and test_recv_timings() is
+        re-run over the whole prefix until no collision is reported.  Both
+        modes return identical results; the reference mode is only kept for
+        cross-checking.
+
+        The result also has the best lendist-weighted average bitrate of all
+        collision-free transmit timings, so there is nothing left to search
+        for: the bitrate of each bit length falls with its transmit timing,
+        and the smallest valid timing for a bit length only depends on the
+        previous timing through last_timing and last_maxsamples, which are
+        both monotonic in that timing.  By induction, the greedy choice is
+        the smallest possible timing for every bit length at the same time,
+        i.e. it maximizes every term of the bitrate sum.
         """
-        print()
-        print("** FINDING TIMING CONFIG FOR DIRECTION '%s' **" % ("MASTER -> SLAVE" if direction == 0 else "SLAVE -> MASTER"))
         transmit_timings = []
-        for bits in range(1, 6):
-            transmit_timings.append(1 if bits <= 1 else transmit_timings[-1] + 1)
-            while True:
-                sample_timings = self.test_recv_timings(send_period, recv_period, pulse_jitter, transmit_timings, False)
-                if len(sample_timings) > 0:
-                    break
-                transmit_timings[-1] += 1
-        self.test_recv_timings(send_period, recv_period, pulse_jitter, transmit_timings, True)
-        print("Bitrate vs. pulse length:");
-        avgbitrate = 0
-        for bits in range(1, 6):
-            print("    @%d: %6.2f MBit/s  (expected %2d%%)" % (bits, (1000 / send_period) * bits / transmit_timings[bits-1], 100*self.lendist[bits-1]))
-            avgbitrate += self.lendist[bits-1] * (1000 / send_period) * bits / transmit_timings[bits-1]
-        print("    ==> %6.2f MBit/s  (expected avg.)" % avgbitrate)
-        self.results["M2S_BW" if direction == 0 else "S2M_BW"] = avgbitrate
-        self.results["M2S_TT" if direction == 0 else "S2M_TT"] = transmit_timings
-        self.results["M2S_ST" if direction == 0 else "S2M_ST"] = sample_timings
-        print("TRANSMIT TIMINGS: %s" % transmit_timings);
-        print("SAMPLE TIMINGS: %s" % sample_timings);
+        if reference:
+            for bits in range(1, len(self.lendist)+1):
+                transmit_timings.append(1 if bits <= 1 else transmit_timings[-1] + 1)
+                while True:
+                    sample_timings = self.test_recv_timings(send_period, recv_period, pulse_jitter, transmit_timings, False)
+                    if len(sample_timings) > 0:
+                        break
+                    transmit_timings[-1] += 1
+            return transmit_timings
+
+        last_timing = 0
+        last_maxsamples = 0
+        for bits in range(1, len(self.lendist)+1):
+            t = self.next_transmit_timing(send_period, recv_period, pulse_jitter, last_timing, last_maxsamples)
+            transmit_timings.append(t)
+            last_timing = t
+            last_maxsamples = int((t * send_period + pulse_jitter) / recv_period + 1)
+        return transmit_timings
+
+    def next_transmit_timing(self, send_period, recv_period, pulse_jitter, last_timing, last_maxsamples):
+        """
+        Returns the smallest transmit timing larger than last_timing that can
+        not be confused with a pulse of up to last_maxsamples samples.
+        """
+        def minsamples(t):
+            return int((t * send_period - pulse_jitter) / recv_period)
+
+        t = max(last_timing + 1, int(math.ceil(((last_maxsamples + 1) * recv_period + pulse_jitter) / send_period)))
+        while minsamples(t) <= last_maxsamples:
+            t += 1
+        while t - 1 > last_timing and minsamples(t - 1) > last_maxsamples:
+            t -= 1
+        return t
+
+    def solve_direction(self, send_period, recv_period, pulse_jitter, reference=False):
+        """
+        Silently solve one direction of the link and return a TimingConfig.
+
+        See find_transmit_timings() for the meaning of the reference argument.
+        """
+        transmit_timings = self.find_transmit_timings(send_period, recv_period, pulse_jitter, reference)
+        return self.make_config(send_period, recv_period, pulse_jitter, transmit_timings)
+
+    def make_config(self, send_period, recv_period, pulse_jitter, transmit_timings):
+        """
+        Returns the TimingConfig for the given (not necessarily minimal)
+        transmit timings.  The transmit timings are not checked for
+        collisions; use test_recv_timings() for that.
+        """
+        sample_windows = []
+        for t in transmit_timings:
+            sample_windows.append((int((t * send_period - pulse_jitter) / recv_period),
+                    int((t * send_period + pulse_jitter) / recv_period + 1)))
+        bitrates = []
+        bandwidth = 0
+        for bits in range(1, len(transmit_timings)+1):
+            bitrates.append((1000 / send_period) * bits / transmit_timings[bits-1])
+            bandwidth += self.lendist[bits-1] * (1000 / send_period) * bits / transmit_timings[bits-1]
+        return TimingConfig(send_period, recv_period, pulse_jitter, tuple(transmit_timings),
+                tuple(w[0] for w in sample_windows), tuple(sample_windows), tuple(bitrates), bandwidth,
+                tuple(self.lendist))
+
+    def jitter_margin(self, send_period, recv_period, transmit_timings):
+        """
+        Returns a tuple (max_jitter, margins) for fixed transmit timings.
+
+        margins holds, for each bit length, the largest pulse_jitter for
+        which the sample window of that bit length does not collide with the
+        window of the previous bit length (or, for a single bit, is still
+        sampled at least once).  max_jitter is the smallest of these values,
+        i.e. the largest pulse_jitter for which test_recv_timings() succeeds.
+        See jitter_margin_grid() for details.
+        """
+        max_jitter, margins = self.jitter_margin_grid(send_period, recv_period, [transmit_timings])
+        return float(max_jitter[0]), tuple(float(m) for m in margins[0])
+
+    def jitter_margin_grid(self, send_periods, recv_periods, transmit_timings, iterations=48):
+        """
+        Vectorized version of jitter_margin().  send_periods and recv_periods
+        are (broadcastable) arrays and transmit_timings is an array with one
+        more trailing dimension holding the timings for each bit length.
+
+        The margins are found by bisecting pulse_jitter for all configurations
+        and bit lengths at once, using the same expressions for minsamples
+        and maxsamples as test_recv_timings().  The result is exact to within
+        (transmit timing * send period) / 2**iterations.  A margin of zero
+        means that the configuration does not decode even without jitter.
+
+        Returns a tuple (max_jitter, margins) of arrays.
+        """
+        transmit_timings = np.asarray(transmit_timings, dtype=np.int64)
+        send_periods, recv_periods = np.broadcast_arrays(
+                np.asarray(send_periods, dtype=np.float64)[..., None],
+                np.asarray(recv_periods, dtype=np.float64)[..., None])
+        shape = np.broadcast(send_periods, transmit_timings).shape
+        tt = np.broadcast_to(transmit_timings, shape)
+        tp = np.broadcast_to(send_periods, shape)
+        sp = np.broadcast_to(recv_periods, shape)
+
+        prev_tt = np.concatenate([np.zeros(shape[:-1] + (1,), dtype=np.int64), tt[..., :-1]], axis=-1)
+        first = np.zeros(shape, dtype=bool)
+        first[..., 0] = True
+
+        def decodes(pj):
+            minsamples = np.trunc((tt * tp - pj) / sp)
+            last_maxsamples = np.where(first, 0, np.trunc((prev_tt * tp + pj) / sp + 1))
+            return minsamples > last_maxsamples
+
+        lo = np.zeros(shape)
+        hi = tt * tp
+        valid = decodes(lo)
+        for i in range(iterations):
+            mid = (lo + hi) / 2
+            ok = decodes(mid)
+            lo = np.where(ok, mid, lo)
+            hi = np.where(ok, hi, mid)
+        margins = np.where(valid, lo, 0.0)
+        return margins.min(axis=-1), margins
+
+    def solve(self, master_period, slave_period, m2s_pulse_jitter, s2m_pulse_jitter, reference=False):
+        """
+        Silently solve both directions of the link and return a LinkConfig.
+        Use format_config() and format_core_config() to create a report.
+        """
+        m2s = self.solve_direction(master_period, slave_period, m2s_pulse_jitter, reference)
+        s2m = self.solve_direction(slave_period, master_period, s2m_pulse_jitter, reference)
+        return LinkConfig(m2s, s2m, pack_timings(m2s.transmit_timings, s2m.sample_timings),
+                pack_timings(s2m.transmit_timings, m2s.sample_timings))
+
+    def find_config(self, direction, send_period, recv_period, pulse_jitter, reference=False):
+        """
+        Compute and report the timing configuration needed by a master and/or slave to its peer.
+
+        See find_transmit_timings() for the meaning of the reference argument.
+        """
+        config = self.solve_direction(send_period, recv_period, pulse_jitter, reference)
+        print(format_config(config, direction))
+        self.results["M2S_BW" if direction == 0 else "S2M_BW"] = config.bandwidth
+        self.results["M2S_TT" if direction == 0 else "S2M_TT"] = list(config.transmit_timings)
+        self.results["M2S_ST" if direction == 0 else "S2M_ST"] = list(config.sample_timings)
+        return config
+
+    def solve_grid(self, send_periods, recv_periods, jitters):
+        """
+        Vectorized version of find_config() for many configurations at once.
+
+        send_periods, recv_periods and jitters are (broadcastable) arrays with
+        the transmitter period, the receiver sample period and the pulse
+        jitter, in the same units as for find_config().  Instead of bumping
+        each transmit timing by one and re-testing the whole prefix, the
+        smallest collision-free transmit timing for every bit length is
+        computed directly from the maxsamples of the previous bit length and
+        then corrected by +/- 1 for floating point rounding, using exactly the
+        same expressions as test_recv_timings().  The results are therefore
+        identical to what find_config() would report.
+
+        Returns a tuple (transmit_timings, sample_timings, bandwidth).  The
+        first two are integer arrays with one extra trailing dimension of
+        len(self.lendist) elements, the last one is the expected average
+        bitrate in MBit/s.
+        """
+        return self.solve_interval_grid(send_periods, send_periods, recv_periods, recv_periods, jitters)
+
+    def solve_interval_grid(self, send_min, send_max, recv_min, recv_max, jitters):
+        """
+        Like solve_grid(), but for transmitter and receiver periods that are
+        only known to lie within the ranges [send_min, send_max] and
+        [recv_min, recv_max], e.g. because of oscillator tolerances or
+        spread-spectrum clocking (see period_range()).
+
+        For each bit length the shortest possible pulse is sent with the
+        fastest transmitter clock and sampled with the slowest receiver clock,
+        and vice versa for the longest possible pulse.  The resulting transmit
+        timings are therefore valid across the whole range.  The returned
+        sample timings are the minimum sample counts over the whole range, and
+        the bandwidth is the guaranteed bandwidth at the slowest transmitter
+        clock send_max.
+
+        With send_min == send_max and recv_min == recv_max this is identical
+        to solve_grid().
+        """
+        send_min, send_max, recv_min, recv_max, jitters = np.broadcast_arrays(
+                np.asarray(send_min, dtype=np.float64),
+                np.asarray(send_max, dtype=np.float64),
+                np.asarray(recv_min, dtype=np.float64),
+                np.asarray(recv_max, dtype=np.float64),
+                np.asarray(jitters, dtype=np.float64))
+        shape = send_min.shape
+        tp_lo = send_min.ravel()
+        tp_hi = send_max.ravel()
+        sp_lo = recv_min.ravel()
+        sp_hi = recv_max.ravel()
+        pj = jitters.ravel()
+
+        def minsamples(t):
+            return np.trunc((t * tp_lo - pj) / sp_hi).astype(np.int64)
+
+        def maxsamples(t):
+            return np.trunc((t * tp_hi + pj) / sp_lo + 1).astype(np.int64)
+
+        maxbits = len(self.lendist)
+        transmit_timings = np.zeros((tp_lo.size, maxbits), dtype=np.int64)
+        sample_timings = np.zeros((tp_lo.size, maxbits), dtype=np.int64)
+        last_timing = np.zeros(tp_lo.size, dtype=np.int64)
+        last_maxsamples = np.zeros(tp_lo.size, dtype=np.int64)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for bits in range(1, maxbits+1):
+                t = np.ceil(((last_maxsamples + 1) * sp_hi + pj) / tp_lo)
+                t = np.maximum(last_timing + 1, t.astype(np.int64))
+                while True:
+                    fix = minsamples(t) <= last_maxsamples
+                    if not fix.any():
+                        break
+                    t[fix] += 1
+                while True:
+                    fix = (t - 1 > last_timing) & (minsamples(t - 1) > last_maxsamples)
+                    if not fix.any():
+                        break
+                    t[fix] -= 1
+                transmit_timings[:, bits-1] = t
+                sample_timings[:, bits-1] = minsamples(t)
+                last_timing = t
+                last_maxsamples = maxsamples(t)
+
+        bandwidth = np.zeros(tp_hi.size)
+        for bits in range(1, maxbits+1):
+            bandwidth += self.lendist[bits-1] * (1000 / tp_hi) * bits / transmit_timings[:, bits-1]
+
+        return (transmit_timings.reshape(shape + (maxbits,)),
+                sample_timings.reshape(shape + (maxbits,)),
+                bandwidth.reshape(shape))
+
+def period_range(period, ppm=0, ssc=0):
+    """
+    Returns the (min, max) period for a clock with the given nominal period,
+    a frequency tolerance of +/- ppm parts per million and an optional
+    down-spread spread-spectrum modulation of ssc (e.g. 0.005 for 0.5%).
+    Works with scalars and NumPy arrays.
+    """
+    period = np.asarray(period, dtype=np.float64)
+    return period / (1 + ppm * 1e-6), period / (1 - ppm * 1e-6) / (1 - ssc)
 
 if __name__ == "__main__":
-    if len(sys.argv) == 5:
+    if len(sys.argv) in (5, 6, 8) and sys.argv[1] == "-measured":
+        import json
+        master_period = float(sys.argv[3])
+        slave_period = float(sys.argv[4])
+        sigmas = float(sys.argv[5]) if len(sys.argv) > 5 else 6.0
+        profiles = [int(sys.argv[6]), int(sys.argv[7])] if len(sys.argv) > 6 else [None, None]
+
+        try:
+            with open(sys.argv[2]) as f:
+                report = json.load(f)
+        except IOError:
+            sys.exit("Can't open input file '%s'!" % sys.argv[2])
+        except ValueError as e:
+            sys.exit("%s is not valid JSON: %s" % (sys.argv[2], e))
+
+        try:
+            measured = list()
+            for direction, profile in enumerate(profiles):
+                found = [p for p in report["profiles"] if p["direction"] == direction and profile in (None, p["profile"])]
+                name = "M2S" if direction == 0 else "S2M"
+                if not found:
+                    sys.exit("No %s pulses%s in %s." % (name, "" if profile is None else " with timing profile %d" % profile, sys.argv[2]))
+                if len(found) > 1:
+                    sys.exit("%s pulses with timing profiles %s in %s, select one with <m2s-profile> <s2m-profile>." %
+                            (name, ", ".join(str(p["profile"]) for p in found), sys.argv[2]))
+                measured.append(found[0])
+            sample_period = float(report["sample_period"])
+        except (KeyError, TypeError, ValueError) as e:
+            sys.exit("%s is no analyzer.py -J report: missing or malformed entry %s" % (sys.argv[2], e))
+
+        jitters = list()
+        for p in measured:
+            try:
+                jitters.append(measured_jitter(p, sample_period, sigmas))
+            except ValueError as e:
+                sys.exit("%s pulses in %s: %s." % ("M2S" if p["direction"] == 0 else "S2M", sys.argv[2], e))
+
+        print()
+        print("** TIMING SPECIFICATION SUMMARY **")
+        print("    Master clock: %.3f ns (%.2f MHz)" % (master_period, 1000 / master_period))
+        print("    Slave clock: %.3f ns (%.2f MHz)" % (slave_period, 1000 / slave_period))
+        print("    Margin: %g sigma" % sigmas)
+        for direction in range(2):
+            print(format_measured_jitter(jitters[direction], direction))
+
+        from timingcache import get_solver
+        solver = get_solver()
+        link = solver.solve(master_period, slave_period, jitters[0].pulse_jitter, jitters[1].pulse_jitter)
+        print(format_config(link.m2s, 0))
+        print(format_config(link.s2m, 1))
+        print(format_core_config(link))
+
+        # the transmit timings of the capture, in cycles of the transmitter clock
+        print()
+        print("** BANDWIDTH COMPARED WITH THE CAPTURED CONFIGURATION **")
+        for direction, config in enumerate([link.m2s, link.s2m]):
+            jitter = jitters[direction]
+            cycles = [t * jitter.cycle / config.send_period for t in jitter.timings]
+            current = [int(round(c)) for c in cycles]
+            if max(abs(c - t) for c, t in zip(cycles, current)) > 0.1:
+                print("    WARNING: the captured pulse widths are no multiple of the %.3f ns clock (wrong profile order?)" % config.send_period)
+            name = "M2S" if direction == 0 else "S2M"
+            if not solver.test_recv_timings(config.send_period, config.recv_period, config.pulse_jitter, current, False):
+                print("    %s: transmit timings %s FAIL the %g sigma margin, use %s (%6.2f MBit/s)" % (name,
+                        current, sigmas, list(config.transmit_timings), config.bandwidth))
+                continue
+            old = solver.make_config(config.send_period, config.recv_period, config.pulse_jitter, current)
+            print("    %s: transmit timings %s -> %s, %6.2f -> %6.2f MBit/s (%+.2f%%)" % (name,
+                    current, list(config.transmit_timings), old.bandwidth, config.bandwidth,
+                    100 * (config.bandwidth - old.bandwidth) / old.bandwidth))
+        print()
+
+    elif len(sys.argv) == 5:
         master_period = float(sys.argv[1])
         slave_period = float(sys.argv[2])
         m2s_pulse_jitter = float(sys.argv[3])
@@ -202,45 +702,27 @@ if __name__ == "__main__":
         print("    Master->Slave pulse jitter: %.3f ns" % (m2s_pulse_jitter))
         print("    Slave->Master pulse jitter: %.3f ns" % (s2m_pulse_jitter))
 
-        solver = TimingSolver()
-        solver.find_config(0, master_period, slave_period, m2s_pulse_jitter);
-        solver.find_config(1, slave_period, master_period, s2m_pulse_jitter);
-
-        print()
-        print("** CORE CONFIGURATION **")
-        print(".MASTER_TIMINGS(80'h%02x%02x%02x%02x%02x%02x%02x%02x%02x%02x)," % (
-                solver.results["M2S_TT"][4], solver.results["M2S_TT"][3], solver.results["M2S_TT"][2], solver.results["M2S_TT"][1], solver.results["M2S_TT"][0],
-                solver.results["S2M_ST"][4], solver.results["S2M_ST"][3], solver.results["S2M_ST"][2], solver.results["S2M_ST"][1], solver.results["S2M_ST"][0]))
-        print(".SLAVE_TIMINGS(80'h%02x%02x%02x%02x%02x%02x%02x%02x%02x%02x)" % (
-                solver.results["S2M_TT"][4], solver.results["S2M_TT"][3], solver.results["S2M_TT"][2], solver.results["S2M_TT"][1], solver.results["S2M_TT"][0],
-                solver.results["M2S_ST"][4], solver.results["M2S_ST"][3], solver.results["M2S_ST"][2], solver.results["M2S_ST"][1], solver.results["M2S_ST"][0]))
+        from timingcache import get_solver
+        solver = get_solver()
+        link = solver.solve(master_period, slave_period, m2s_pulse_jitter, s2m_pulse_jitter)
+        print(format_config(link.m2s, 0))
+        print(format_config(link.s2m, 1))
+        print(format_core_config(link))
         print()
 
     elif len(sys.argv) == 2 and sys.argv[1] == "-plot":
-        x_slave_period = list()
-        y_m2s_bitrate = list()
-        y_s2m_bitrate = list()
-
-        for k in range(50, 200):
-            master_period = 100.0
-            slave_period = k
-            m2s_pulse_jitter = 0.5
-            s2m_pulse_jitter = 0.5
+        master_period = 100.0
+        m2s_pulse_jitter = 0.5
+        s2m_pulse_jitter = 0.5
 
-            solver = TimingSolver()
-            solver.find_config(0, master_period, slave_period, m2s_pulse_jitter);
-            solver.find_config(1, slave_period, master_period, s2m_pulse_jitter);
+        x_slave_period = np.arange(50, 200, dtype=np.float64)
 
-            x_slave_period.append(slave_period)
-            y_m2s_bitrate.append(solver.results["M2S_BW"])
-            y_s2m_bitrate.append(solver.results["S2M_BW"])
+        solver = TimingSolver()
+        y_m2s_bitrate = solver.solve_grid(master_period, x_slave_period, m2s_pulse_jitter)[2]
+        y_s2m_bitrate = solver.solve_grid(x_slave_period, master_period, s2m_pulse_jitter)[2]
 
         from matplotlib import pyplot as plt
 
-        x_slave_period = np.array(x_slave_period)
-        y_m2s_bitrate = np.array(y_m2s_bitrate)
-        y_s2m_bitrate = np.array(y_s2m_bitrate)
-
         plt.figure(figsize=(10, 5))
         plt.title("Bandwidth, normalized using master clock frequency")
         plt.plot(x_slave_period / 100, y_m2s_bitrate / 10, label="master -> slave")
@@ -259,5 +741,8 @@ if __name__ == "__main__":
     else:
         sys.exit(
             ('Usage: %s <master-period-ns> <slave-period-ns> \\\n' % sys.argv[0]) +
-            ('    <master-to-slave-max-pulse-jitter-ns> <slave-to-master-max-pulse-jitter-ns>'))
+            ('    <master-to-slave-max-pulse-jitter-ns> <slave-to-master-max-pulse-jitter-ns>\n') +
+            ('       %s -measured <analyzer-jitter.json> <master-period-ns> <slave-period-ns> \\\n' % sys.argv[0]) +
+            ('    [<sigmas> [<m2s-profile> <s2m-profile>]]\n') +
+            ('       %s -plot' % sys.argv[0]))
 
@@ -7,7 +7,8 @@ from __future__ import absolute_import
 import sys
 sys.path.append('../plinksrc')
 
-from timings import TimingSolver
+from timings import format_config
+from timingcache import get_solver
 import numpy as np
 # np.random.seed(42)
 
@@ -38,6 +39,8 @@ for i in range(100+np.random.randint(400)):
     if np.random.randint(100) == 0:
         s2m_data[-1][2] = 1
 
+solver = get_solver()
+
 while True:
     master_parbits = np.random.choice([1, 2, 4])
     slave_parbits = np.random.choice([1, 2, 4])
@@ -48,29 +51,10 @@ while True:
     master_pulse_jitter = np.random.uniform(0.01, 0.3 * (master_period / master_parbits))
     slave_pulse_jitter = np.random.uniform(0.01, 0.3 * (slave_period / slave_parbits))
 
-    print("/* --- TIMING SOLVER REPORT --- **")
-    print()
-    print("  master_clk_period   = %6.3f" % master_period)
-    print("  master_bit_period   = %6.3f" % (master_period / master_parbits))
-    print("  master_pulse_jitter = %6.3f" % master_pulse_jitter)
-    print("  master_parbits = %d" % master_parbits)
-    print()
-    print("  slave_clk_period   = %6.3f" % slave_period)
-    print("  slave_bit_period   = %6.3f" % (slave_period / slave_parbits))
-    print("  slave_pulse_jitter = %6.3f" % slave_pulse_jitter)
-    print("  slave_parbits = %d" % slave_parbits)
-    print()
-
-    solver = TimingSolver()
-    solver.find_config(0, master_period / master_parbits, slave_period / slave_parbits, master_pulse_jitter)
-    solver.find_config(1, slave_period / slave_parbits, master_period / master_parbits, slave_pulse_jitter)
-
-    print()
-    print("** --- TIMING SOLVER REPORT --- */")
-    print()
+    link = solver.solve(master_period / master_parbits, slave_period / slave_parbits, master_pulse_jitter, slave_pulse_jitter)
 
     all_configs_ok = True
-    for v in solver.results["M2S_TT"] + solver.results["S2M_TT"] + solver.results["M2S_ST"] + solver.results["S2M_ST"]:
+    for v in link.m2s.transmit_timings + link.s2m.transmit_timings + link.m2s.sample_timings + link.s2m.sample_timings:
         if v > 255: all_configs_ok = False
 
     if all_configs_ok:
@@ -78,6 +62,24 @@ while True:
 
     print("// A timing parameter is out of range: restart random timing generation")
 
+print("/* --- TIMING SOLVER REPORT --- **")
+print()
+print("  master_clk_period   = %6.3f" % master_period)
+print("  master_bit_period   = %6.3f" % (master_period / master_parbits))
+print("  master_pulse_jitter = %6.3f" % master_pulse_jitter)
+print("  master_parbits = %d" % master_parbits)
+print()
+print("  slave_clk_period   = %6.3f" % slave_period)
+print("  slave_bit_period   = %6.3f" % (slave_period / slave_parbits))
+print("  slave_pulse_jitter = %6.3f" % slave_pulse_jitter)
+print("  slave_parbits = %d" % slave_parbits)
+print()
+print(format_config(link.m2s, 0))
+print(format_config(link.s2m, 1))
+print()
+print("** --- TIMING SOLVER REPORT --- */")
+print()
+
 print("`define m2s_tdata_width %d" % m2s_tdata_width)
 print("`define m2s_tuser_width %d" % m2s_tuser_width)
 print("`define s2m_tdata_width %d" % s2m_tdata_width)
@@ -95,13 +97,8 @@ print("`define slave_pulse_jitter_ns %.2f" % slave_pulse_jitter)
 print("`define master_parbits %d" % master_parbits)
 print("`define slave_parbits %d" % slave_parbits)
 
-print("`define master_timings 80'h%02x%02x%02x%02x%02x%02x%02x%02x%02x%02x" % (
-    solver.results["M2S_TT"][4], solver.results["M2S_TT"][3], solver.results["M2S_TT"][2], solver.results["M2S_TT"][1], solver.results["M2S_TT"][0],
-    solver.results["S2M_ST"][4], solver.results["S2M_ST"][3], solver.results["S2M_ST"][2], solver.results["S2M_ST"][1], solver.results["S2M_ST"][0]))
-
-print("`define slave_timings 80'h%02x%02x%02x%02x%02x%02x%02x%02x%02x%02x" % (
-    solver.results["S2M_TT"][4], solver.results["S2M_TT"][3], solver.results["S2M_TT"][2], solver.results["S2M_TT"][1], solver.results["S2M_TT"][0],
-    solver.results["M2S_ST"][4], solver.results["M2S_ST"][3], solver.results["M2S_ST"][2], solver.results["M2S_ST"][1], solver.results["M2S_ST"][0]))
+print("`define master_timings 80'h%020x" % link.master_timings)
+print("`define slave_timings 80'h%020x" % link.slave_timings)
 
 print("""
 `timescale 1 ns / 1 ps